@@ -76,6 +76,9 @@ class AngularFormlyAdapter(BaseAdapter):
         if 'choices' in field:
             new_field['templateOptions']['options'] = field['choices']
 
+        if 'choices_endpoint' in field:
+            new_field['templateOptions']['choicesEndpoint'] = field['choices_endpoint']
+
         return new_field
 
     def _render_fieldset(self, fieldset, fields_map):
@@ -182,6 +185,9 @@ class EmberAdapter(BaseAdapter):
         if 'choices' in field:
             new_field['extra']['choices'] = field['choices']
 
+        if 'choices_endpoint' in field:
+            new_field['extra']['choices_endpoint'] = field['choices_endpoint']
+
         if 'related_endpoint' in field:
             new_field['extra']['related_model'] = '/'.join(
                 filter(bool, [field['related_endpoint'].get('app'), field['related_endpoint'].get('singular')])
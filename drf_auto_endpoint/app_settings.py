@@ -40,6 +40,19 @@ DEFAULT_SETTINGS = {
     'ACTION_BTN_CLASS': 'btn btn-default',
     'ROUTER_CLASS': 'drf_auto_endpoint.router.EndpointRouter',
     'DEFAULT_ENDPOINT_MODULES': 'endpoints',
+    'METADATA_CACHE': False,
+    'CHOICES_CACHE': False,
+    'CHOICES_CACHE_TIMEOUT': 300,
+    'LAZY_ENDPOINTS': False,
+    'SERPY_TYPE_MAPPING': {},
+    'CACHE_ALIAS': 'default',
+    'AGGREGATE_CACHE': False,
+    'AGGREGATE_CACHE_TIMEOUT': 300,
+    'RESPONSE_CACHE_TIMEOUT': 300,
+    'ROW_CACHE_TIMEOUT': 3600,
+    'COALESCE_TIMEOUT': 5,
+    'INSTRUMENTATION_SINK': None,
+    'QUERY_BUDGET_ACTION': 'log',
 }
 
 
@@ -19,3 +19,16 @@ class DRFAutoEndpointConfig(AppConfig):
             pass
 
         autodiscover_modules('endpoints', register_to=router)
+
+        if hasattr(router, 'freeze'):
+            router.freeze()
+
+        from .app_settings import settings
+        from .cache import model_versions
+        # versions have to be bumped by every process, not only by those serving cached results
+        for endpoint in getattr(router, '_endpoints', {}).values():
+            if getattr(endpoint, 'response_cache', False) or getattr(endpoint, 'row_cache', False) or \
+                    (hasattr(endpoint, 'has_conditional_get') and endpoint.has_conditional_get()):
+                model_versions.connect(endpoint.get_cache_models())
+            elif settings.AGGREGATE_CACHE and getattr(endpoint, 'aggregate_cache', False):
+                model_versions.connect([endpoint.model])
@@ -0,0 +1,342 @@
+import json
+from hashlib import sha1
+from threading import Event, Lock, RLock
+from time import time
+from weakref import WeakKeyDictionary
+
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import router, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .app_settings import settings
+
+
+class MetadataCache(object):
+    """
+    Process-local store for adapted metadata documents.
+
+    Entries are grouped by endpoint (weakly referenced so that replaced endpoints
+    don't leak) and keyed by whatever `AutoMetadataMixin.get_metadata_cache_key`
+    returns (adapter class, language, permission set, ...).
+    """
+
+    def __init__(self):
+        self._entries = WeakKeyDictionary()
+        self._lock = RLock()
+
+    def get(self, endpoint, key):
+        # documents may embed choices which have expired
+        choices_cache.expire()
+        with self._lock:
+            return self._entries.get(endpoint, {}).get(key, None)
+
+    def set(self, endpoint, key, value):
+        with self._lock:
+            self._entries.setdefault(endpoint, {})[key] = value
+
+    def invalidate(self, endpoint=None):
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(endpoint, None)
+
+
+metadata_cache = MetadataCache()
+
+
+def get_through_models(model):
+    """
+    The intermediate models of the many-to-many relations of `model`, in both directions.
+    """
+    rv = []
+    for field in model._meta.get_fields():
+        if not field.many_to_many:
+            continue
+        through = field.remote_field.through if field.concrete else getattr(field, 'through', None)
+        if isinstance(through, type) and through not in rv:
+            rv.append(through)
+    return rv
+
+
+class ModelSignalsReceiver(object):
+    """
+    Receives the save, delete and many-to-many signals of the models it has been connected to.
+
+    Receivers are connected per model rather than for every sender: Django can only fast-delete
+    the records of models which don't have any delete receiver.
+    """
+
+    dispatch_uid_prefix = None
+
+    def __init__(self):
+        self._models = set()
+
+    def connect(self, models):
+        for model in models:
+            for sender in (model, model._meta.concrete_model):
+                if sender in self._models:
+                    continue
+                self._models.add(sender)
+                uid = '{}_{}'.format(self.dispatch_uid_prefix, sender._meta.label_lower)
+                post_save.connect(self._on_change, sender=sender, dispatch_uid=uid + '_post_save')
+                post_delete.connect(self._on_change, sender=sender, dispatch_uid=uid + '_post_delete')
+                for through in get_through_models(sender):
+                    m2m_changed.connect(self._on_m2m_change, sender=through,
+                                        dispatch_uid='{}_{}_m2m_changed'.format(
+                                            self.dispatch_uid_prefix, through._meta.label_lower))
+
+    def _on_change(self, sender, **kwargs):
+        raise NotImplementedError
+
+    def _on_m2m_change(self, sender, instance, model, **kwargs):
+        raise NotImplementedError
+
+
+def invalidate_metadata_cache(endpoint=None):
+    """
+    Drop cached metadata for `endpoint`, or for every endpoint if `endpoint` is None.
+    """
+    metadata_cache.invalidate(endpoint)
+
+
+class ChoicesCache(ModelSignalsReceiver):
+    """
+    Process-local store for inlined foreign key choices.
+
+    Choices are computed once per related model, key attribute and query and dropped as soon
+    as a record of that model is saved, deleted or has its many-to-many relations changed, or
+    after `DRF_AUTO_CHOICES_CACHE_TIMEOUT` seconds for the writes which don't send signals (or are
+    made by other processes).
+    """
+
+    dispatch_uid_prefix = 'drf_auto_endpoint_choices'
+
+    def __init__(self):
+        super(ChoicesCache, self).__init__()
+        self._entries = {}
+        self._next_expiry = None
+        self._generations = {}
+        self._epoch = 0
+        self._lock = RLock()
+
+    def get(self, queryset, key_attr):
+        try:
+            key = (key_attr, str(queryset.query))
+        except EmptyResultSet:
+            return []
+
+        self.expire()
+        model = queryset.model._meta.concrete_model
+        with self._lock:
+            entry = self._entries.get(model, {}).get(key, None)
+            generation = (self._epoch, self._generations.get(model, 0))
+        if entry is not None:
+            return entry[0]
+
+        self.connect([queryset.model])
+        rv = [
+            {
+                'label': record.__str__(),
+                'value': getattr(record, key_attr)
+            } for record in queryset
+        ]
+        timeout = settings.CHOICES_CACHE_TIMEOUT
+        expires = time() + timeout if timeout is not None else None
+        with self._lock:
+            # don't store choices computed while the table was being modified
+            if generation == (self._epoch, self._generations.get(model, 0)):
+                self._entries.setdefault(model, {})[key] = (rv, expires)
+                if expires is not None and (self._next_expiry is None or expires < self._next_expiry):
+                    self._next_expiry = expires
+        return rv
+
+    def expire(self):
+        """
+        Drop the choices which have been cached for longer than `DRF_AUTO_CHOICES_CACHE_TIMEOUT`.
+        """
+        now = time()
+        with self._lock:
+            if self._next_expiry is None or now < self._next_expiry:
+                return
+            self._next_expiry = None
+            for model, entries in list(self._entries.items()):
+                for key, (rv, expires) in list(entries.items()):
+                    if expires is None:
+                        continue
+                    if expires <= now:
+                        del entries[key]
+                    elif self._next_expiry is None or expires < self._next_expiry:
+                        self._next_expiry = expires
+                if not entries:
+                    del self._entries[model]
+        invalidate_metadata_cache()
+
+    def invalidate(self, model=None):
+        with self._lock:
+            if model is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                model = model._meta.concrete_model
+                self._generations[model] = self._generations.get(model, 0) + 1
+                if self._entries.pop(model, None) is None:
+                    return
+        # metadata documents may embed the choices we just dropped
+        invalidate_metadata_cache()
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate(sender)
+
+    def _on_m2m_change(self, sender, instance, model, **kwargs):
+        self.invalidate(instance.__class__)
+        self.invalidate(model)
+
+
+choices_cache = ChoicesCache()
+
+
+class InFlightCall(object):
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+
+
+class SingleFlight(object):
+    """
+    Process-local coalescing of identical concurrent calls: while a call is in flight for a key,
+    other calls for the same key wait for its result instead of running it again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return (result, shared). `fn` is only called if no call is in flight for `key`, otherwise
+        the result of that call is returned with `shared` set to True. If that call fails or
+        doesn't finish within `timeout` seconds, `fn` is called anyway.
+        """
+        with self._lock:
+            call = self._calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = InFlightCall()
+
+        if not leader:
+            self.waiting(key)
+            if call.event.wait(timeout) and call.result is not None:
+                return call.result, True
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def waiting(self, key):
+        """
+        Called when a call starts waiting for the one in flight for `key`.
+        """
+        pass
+
+
+single_flight = SingleFlight()
+
+
+def get_permission_key(request):
+    """
+    Return a hashable representation of the permissions of the user making `request`.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if user.is_superuser:
+        return ('__superuser__', )
+    return tuple(sorted(user.get_all_permissions()))
+
+
+def get_cache():
+    return caches[settings.CACHE_ALIAS]
+
+
+class ModelVersions(ModelSignalsReceiver):
+    """
+    Data version of each model, bumped whenever a record is saved, deleted or has its many-to-many
+    relations changed. Only the models it has been connected to (the ones rendered by endpoints
+    caching their results) are tracked.
+
+    Versions are kept in the Django cache (`DRF_AUTO_CACHE_ALIAS`) so that every process sees the
+    same ones as long as that cache is shared. Results cached under a key containing a version are
+    simply never read again once the version changes. Writes that don't send signals
+    (`QuerySet.update`, raw SQL, ...) are only caught up with by the cache timeout.
+    """
+
+    key_prefix = 'drf_auto_endpoint:version:'
+    dispatch_uid_prefix = 'drf_auto_endpoint_versions'
+
+    def get_key(self, model):
+        return self.key_prefix + model._meta.concrete_model._meta.label_lower
+
+    def get(self, model):
+        self.connect([model])
+        cache = get_cache()
+        key = self.get_key(model)
+        version = cache.get(key)
+        if version is None:
+            # start from the current time so that a version evicted from the cache isn't reused
+            version = int(time() * 1000)
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        return version
+
+    def bump(self, model, using=None):
+        """
+        Bump the version of `model` now and, if a transaction is in progress, once more when it
+        commits: other processes may cache the data it is replacing until then.
+        """
+        if using is None:
+            using = router.db_for_write(model)
+        self._bump(model)
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(lambda: self._bump(model), using=using)
+
+    def _bump(self, model):
+        cache = get_cache()
+        key = self.get_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time() * 1000), None)
+
+    def _on_change(self, sender, using=None, **kwargs):
+        self.bump(sender, using)
+
+    def _on_m2m_change(self, sender, instance, model, using=None, **kwargs):
+        self.bump(sender, using)
+        self.bump(instance.__class__, using)
+        self.bump(model, using)
+
+
+model_versions = ModelVersions()
+
+
+def get_query_key(request):
+    """
+    The query string of `request` with its parameters (and their values) sorted.
+    """
+    return sorted((key, sorted(values)) for key, values in request.query_params.lists())
+
+
+def make_digest(*parts):
+    return sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def make_cache_key(prefix, *parts):
+    return '{}:{}'.format(prefix, make_digest(*parts))
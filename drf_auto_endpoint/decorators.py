@@ -10,7 +10,7 @@ from rest_framework.response import Response
 from rest_framework.serializers import PrimaryKeyRelatedField
 
 from .app_settings import settings
-from .utils import action_kwargs, get_field_dict, get_languages
+from .utils import action_kwargs, get_field_dicts, get_languages
 
 
 def custom_action(method='GET', type='request', icon_class=None, btn_class=None, text=None, **kwargs):
@@ -89,7 +89,8 @@ def wizard(target_model, serializer=None, icon_class=None, btn_class=None, text=
                 'singular': model._meta.model_name.lower(),
                 'plural': inflector.pluralize(model._meta.model_name.lower()),
             })
-        fields.append(Adapter.adapt_field(get_field_dict(field_name, serializer)))
+    for field_dict in get_field_dicts(list(serializer_instance.fields.keys()), serializer_instance):
+        fields.append(Adapter.adapt_field(field_dict))
     kwargs['params']['needs'] = needs
     kwargs['params']['fields'] = fields
     kwargs['languages'] = get_languages()
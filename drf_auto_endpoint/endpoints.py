@@ -7,10 +7,16 @@ from django.db.models.fields.related import ForeignKey
 from django.conf import settings as django_settings
 from django.utils.module_loading import import_string
 
+try:
+    from django.urls import get_script_prefix, get_urlconf
+except ImportError:
+    # Django < 1.10
+    from django.core.urlresolvers import get_script_prefix, get_urlconf
+
 from inflector import Inflector
 
-from .factories import serializer_factory, viewset_factory
-from .utils import get_languages, get_field_dict, reverse
+from .factories import serializer_factory, viewset_factory, get_lookup_models, get_query_plan
+from .utils import applies_to_field, get_languages, get_field_dicts, reverse
 from .app_settings import settings
 
 try:
@@ -94,6 +100,11 @@ class EndpointMetaClass(type):
                                 for field in value.serializer().fields.keys()
                             ]
 
+        new_class._action_names = tuple(
+            key for key in dir(new_class)
+            if key not in black_list and getattr(getattr(new_class, key, None), 'action_type', None) is not None
+        )
+
         if new_class.fieldsets is None and new_class.model is not None:
             fieldsets_path = os.path.join(
                 django_settings.BASE_DIR,
@@ -124,6 +135,10 @@ class BaseEndpoint(object):
     exclude_fields = ()
     extra_fields = None
     foreign_key_as_list = False
+    lazy_choices = False
+    choices_label_fields = None
+    choices_page_size = 50
+    choices_max_page_size = 500
 
     serializer = None
     fieldsets = None
@@ -137,6 +152,21 @@ class BaseEndpoint(object):
     ordering_fields = None
     page_size = None
     viewset = None
+    select_related = None
+    prefetch_related = None
+    fast_read = False
+    stream_list = False
+    stream_chunk_size = 2000
+    aggregate_cache = True
+    response_cache = False
+    response_cache_timeout = None
+    row_cache = False
+    row_cache_timeout = None
+    conditional_get = False
+    coalesce_list = False
+    coalesce_timeout = None
+    query_budget = None
+    query_budget_action = None
 
     read_only = False
     include_str = True
@@ -155,6 +185,10 @@ class BaseEndpoint(object):
     _translated_field_names = None
     _default_language_field_names = None
     _fieldsets_location = ''
+    _action_names = None
+    _action_index = None
+    _action_urls = None
+    _query_plans = None
 
     def get_languages(self):
         return get_languages()
@@ -235,6 +269,56 @@ class BaseEndpoint(object):
 
         return self.viewset
 
+    def get_query_plan(self, serializer=None):
+        """
+        Return the (select_related, prefetch_related) lookups applied to the viewset's queryset.
+        They are derived from the serializer fields unless `select_related` or `prefetch_related`
+        are set on the endpoint.
+        """
+        if serializer is None:
+            serializer = self.get_serializer()
+        if self._query_plans is None:
+            self._query_plans = {}
+
+        if serializer not in self._query_plans:
+            select_related, prefetch_related = get_query_plan(serializer, self.model)
+            if self.select_related is not None:
+                select_related = tuple(self.select_related)
+            if self.prefetch_related is not None:
+                prefetch_related = tuple(self.prefetch_related)
+            self._query_plans[serializer] = (select_related, prefetch_related)
+
+        return self._query_plans[serializer]
+
+    def get_cache_models(self, serializer=None):
+        """
+        Models whose changes make the cached responses of this endpoint stale: the endpoint's model
+        and the related models rendered along with it.
+        """
+        select_related, prefetch_related = self.get_query_plan(serializer)
+        rv = [self.model]
+        for lookup in select_related + prefetch_related:
+            for model in get_lookup_models(self.model, lookup):
+                if model not in rv:
+                    rv.append(model)
+        return rv
+
+    def has_conditional_get(self):
+        """
+        Whether list and retrieve answer conditional requests, only possible if the model has an
+        `updated_at` field.
+        """
+        return bool(self.conditional_get) and \
+            'updated_at' in [field.name for field in self.model._meta.get_fields()]
+
+    def inlines_choices(self):
+        """
+        Whether the metadata of this endpoint embeds the choices of some of its relations.
+        """
+        return any(applies_to_field(self.foreign_key_as_list, name) and
+                   not applies_to_field(self.lazy_choices, name)
+                   for name in self.get_fields_for_serializer())
+
     def get_url(self):
 
         return '{}/{}'.format(
@@ -242,19 +326,21 @@ class BaseEndpoint(object):
             self.model_name.replace('_', '-')
         )
 
+    def get_choices_url(self, field):
+        return reverse('{}-choices'.format(self.get_url()), kwargs={'field': field})
+
+    def _get_field_dicts(self, fields):
+        return get_field_dicts(fields, self.get_serializer(), self.get_translated_fields(),
+                               self.fields_annotation, self.model,
+                               foreign_key_as_list=self.foreign_key_as_list,
+                               lazy_choices=self.lazy_choices,
+                               choices_url=self.get_choices_url)
+
     def _get_field_dict(self, field):
-        return get_field_dict(field, self.get_serializer(), self.get_translated_fields(),
-                              self.fields_annotation, self.model,
-                              foreign_key_as_list=((isinstance(self.foreign_key_as_list, Iterable) and
-                                                    field in self.foreign_key_as_list) or
-                                                   (not isinstance(self.foreign_key_as_list, Iterable)
-                                                    and self.foreign_key_as_list)))
+        return self._get_field_dicts([field])[0]
 
     def get_fields(self):
-        return [
-            self._get_field_dict(field)
-            for field in self.get_fields_for_serializer()
-        ]
+        return self._get_field_dicts(self.get_fields_for_serializer())
 
     def get_fieldsets(self):
         if self.fieldsets is not None:
@@ -262,11 +348,13 @@ class BaseEndpoint(object):
                     else field
                     for field in self.fieldsets]
 
+        candidates = [field
+                      for field in self.get_fields_for_serializer()
+                      if field != 'id' and field != '__str__' and
+                      field not in self.translated_field_names]
         return [{'key': field}
-                for field in self.get_fields_for_serializer()
-                if field != 'id' and field != '__str__' and
-                field not in self.translated_field_names and
-                self._get_field_dict(field).get('type', '')[:6] != 'tomany']
+                for field, field_dict in zip(candidates, self._get_field_dicts(candidates))
+                if field_dict.get('type', '')[:6] != 'tomany']
 
     def get_list_display(self):
         if self.list_display is None:
@@ -370,20 +458,35 @@ class BaseEndpoint(object):
             self._default_language_field_names = rv
         return self._default_language_field_names
 
-    def get_custom_actions(self):
+    def get_action_index(self):
+        if self._action_index is None:
+            from .factories import build_action_index
+            self._action_index = build_action_index(self, self.get_viewset())
+        return self._action_index
+
+    def _get_indexed_actions(self, action_type):
+        # reversed urls only depend on the active urlconf and script prefix
+        urls_key = (get_urlconf(), get_script_prefix())
+        if self._action_urls is None or self._action_urls[0] != urls_key:
+            self._action_urls = (urls_key, {
+                item['url_name']: reverse(item['url_name'], kwargs=item['url_kwargs'])
+                for item in self.get_action_index()
+            })
+        urls = self._action_urls[1]
+
         rv = []
-        viewset = self.get_viewset()
-
-        for action_name in dir(viewset):
-            action = getattr(viewset, action_name)
-            if getattr(action, 'action_type', None) == 'custom':
-                custom_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower().replace('_', '-')),
-                                   kwargs={getattr(viewset, 'lookup_field', 'pk'): ':id'}),
-                    'verb': action.bind_to_methods[0],
+        for item in self.get_action_index():
+            if item['type'] == action_type:
+                action = {
+                    'url': urls[item['url_name']],
+                    'verb': item['verb'],
                 }
-                custom_action.update(action.action_kwargs)
-                rv.append(custom_action)
+                action.update(item['kwargs'])
+                rv.append(action)
+        return rv
+
+    def get_custom_actions(self):
+        rv = self._get_indexed_actions('custom')
 
         if self.custom_actions is not None:
             rv += self.custom_actions
@@ -391,18 +494,7 @@ class BaseEndpoint(object):
         return rv
 
     def get_bulk_actions(self):
-        rv = []
-        viewset = self.get_viewset()
-
-        for action_name in dir(viewset):
-            action = getattr(viewset, action_name)
-            if getattr(action, 'action_type', None) == 'bulk':
-                bulk_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower())),
-                    'verb': action.bind_to_methods[0],
-                }
-                bulk_action.update(action.action_kwargs)
-                rv.append(bulk_action)
+        rv = self._get_indexed_actions('bulk')
 
         if self.bulk_actions is not None:
             rv += self.bulk_actions
@@ -410,18 +502,7 @@ class BaseEndpoint(object):
         return rv
 
     def get_list_actions(self):
-        rv = []
-        viewset = self.get_viewset()
-
-        for action_name in dir(viewset):
-            action = getattr(viewset, action_name)
-            if getattr(action, 'action_type', None) == 'list':
-                list_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower())),
-                    'verb': action.bind_to_methods[0],
-                }
-                list_action.update(action.action_kwargs)
-                rv.append(list_action)
+        rv = self._get_indexed_actions('list')
 
         if self.list_actions is not None:
             rv += self.list_actions
@@ -440,7 +521,8 @@ class Endpoint(with_metaclass(EndpointMetaClass, BaseEndpoint)):
         arg_names = ('fields', 'serializer', 'permission_classes', 'filter_fields', 'search_fields',
                      'viewset', 'read_only', 'include_str', 'ordering_fields', 'page_size',
                      'base_viewset', 'fields_annotation', 'fieldsets', 'base_serializer', 'list_me',
-                     'serializer_shape') # Added code by RA
+                     'serializer_shape', # Added code by RA
+                     'select_related', 'prefetch_related')
         for arg_name in arg_names:
             setattr(self, arg_name, kwargs.pop(arg_name, getattr(self, arg_name, None)))
 
@@ -455,14 +537,15 @@ class Endpoint(with_metaclass(EndpointMetaClass, BaseEndpoint)):
         else:
             assert self.viewset is not None or self.model is not None, \
                 'You need to specify at least a model or a viewset'
-            self.get_serializer()
+            if self.viewset is not None or not settings.LAZY_ENDPOINTS:
+                self.get_serializer()
 
         if self.viewset is not None:
             for attr in ('permission_classes', 'filter_fields', 'search_fields', 'ordering_fields',
                          'page_size'):
                 assert getattr(self, attr, None) is None, \
                     'You cannot specify both {} and viewset'.format(attr)
-        else:
+        elif not settings.LAZY_ENDPOINTS:
             self.get_viewset()
 
         if self.model is None:
@@ -1,4 +1,8 @@
 from rest_framework import pagination, serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer, TemplateHTMLRenderer
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.filters import OrderingFilter, SearchFilter
 from django.contrib.postgres.fields import JSONField
 
@@ -20,21 +24,38 @@ except ImportError:
     from django.db.models.fields.related import ManyToOneRel, OneToOneRel, ManyToManyRel, ManyToManyField
 
 from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, Max, QuerySet, prefetch_related_objects
 from django.db.models.fields import NOT_PROVIDED
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+try:
+    from rest_framework.decorators import action
+except ImportError:
+    action = None
+    from rest_framework.decorators import list_route
+
+from .cache import (get_cache, get_permission_key, get_query_key, make_cache_key, make_digest,
+                    model_versions, single_flight)
+from .instrumentation import Profile, phase, profiling_enabled, report_profile
+from .pagination import KeysetPagination, get_count_strategy_mixin
+from .renderers import ColumnarJSONRenderer, CSVRenderer, csv_lines, get_columns
+from .utils import applies_to_field, get_action_methods, get_choices_source
 
 
 # ADDED IMPORT
 from rest_framework_recursive.fields import RecursiveField
 from drf_writable_nested import WritableNestedModelSerializer
-from datetime import datetime
+from calendar import timegm
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from drf_aggregates.renderers import AggregateRenderer
 from drf_aggregates.exceptions import AggregateException
-#from config.custom_files.renderers import (DbRenderer, FullCSVRenderer,)
-from config.custom_files.renderers import (CSVEndpointRenderer, CSVRenderer,)
-# from config.custom_files.renderers import CSVException
 from config.custom_files.permissions import CustomDjangoModelPermissions
 
 
@@ -67,9 +88,15 @@ class NullToDefaultMixin(object):
 #####################################
 ### SERIALIZER FACTORY ###
 #####################################
+from functools import partial, wraps
+from itertools import islice
+
 from django.db import models
+from django.utils.module_loading import import_string
 import serpy
 
+from .app_settings import settings as auto_settings
+
 class ForeignKeyField(serpy.Field):
    def to_value(self, value):
        if value != None:
@@ -82,39 +109,94 @@ class ForeignKeyField(serpy.Field):
 
 
 
+class IsoFormatField(serpy.Field):
+    """
+    Dates, datetimes and times rendered in ISO 8601.
+    """
+    def to_value(self, value):
+        return value.isoformat()
+
+
+class DecimalStrField(serpy.Field):
+    """
+    Decimals rendered as strings, without losing precision, as DRF's `DecimalField` does.
+    """
+    def to_value(self, value):
+        return '{:f}'.format(value)
+
+
+class UUIDField(serpy.Field):
+    def to_value(self, value):
+        return str(value)
+
+
+def _optional(field_class):
+    return partial(field_class, required=False)
+
+
+# Resolved along the model field's MRO, so subclasses of these fields use the same serpy field.
+SERPY_TYPE_MAPPING = {
+    models.Field: _optional(serpy.StrField),
+    models.AutoField: _optional(serpy.IntField),
+    models.BigIntegerField: _optional(serpy.IntField),
+    models.IntegerField: _optional(serpy.IntField),
+    models.PositiveIntegerField: _optional(serpy.IntField),
+    models.PositiveSmallIntegerField: _optional(serpy.IntField),
+    models.SmallIntegerField: _optional(serpy.IntField),
+    models.BooleanField: _optional(serpy.BoolField),
+    models.DecimalField: _optional(DecimalStrField),
+    models.FloatField: _optional(serpy.FloatField),
+    models.DateField: _optional(IsoFormatField),
+    models.DateTimeField: _optional(IsoFormatField),
+    models.TimeField: _optional(IsoFormatField),
+    models.UUIDField: _optional(UUIDField),
+    JSONField: _optional(serpy.Field),
+    models.ForeignKey: ForeignKeyField,
+    models.OneToOneField: ForeignKeyField,
+    models.fields.related.ManyToManyField: ForeignKeyField,
+    models.fields.reverse_related.ForeignObjectRel: ForeignKeyField,
+}
+if hasattr(models, 'NullBooleanField'):
+    # Removed in Django 4.0
+    SERPY_TYPE_MAPPING[models.NullBooleanField] = _optional(serpy.StrField)
+if hasattr(models, 'JSONField'):
+    # Django >= 3.1
+    SERPY_TYPE_MAPPING[models.JSONField] = _optional(serpy.Field)
+
+_serpy_type_registry = {
+    'setting': None,
+    'mapping': SERPY_TYPE_MAPPING,
+    'resolved': {},
+}
+
+
 def get_serpy_type(model_field_type):
-    model_serpy_map = {
-        models.AutoField: serpy.IntField(required=False),
-        models.BigIntegerField: serpy.IntField(required=False),
-        models.BooleanField: serpy.BoolField(required=False),
-        models.CharField: serpy.StrField(required=False),
-        models.CommaSeparatedIntegerField: serpy.StrField(required=False),
-        models.DateField: serpy.StrField(required=False),
-        models.DateTimeField: serpy.StrField(required=False),
-        models.DecimalField: serpy.FloatField(required=False),
-        models.EmailField: serpy.StrField(required=False),
-        models.Field: serpy.StrField(required=False),
-        models.FileField: serpy.StrField(required=False),
-        models.FloatField: serpy.FloatField(required=False),
-        models.ImageField: serpy.StrField(required=False),
-        models.IntegerField: serpy.IntField(required=False),
-        models.NullBooleanField: serpy.StrField(required=False),
-        models.PositiveIntegerField: serpy.IntField(required=False),
-        models.PositiveSmallIntegerField: serpy.IntField(required=False),
-        models.SlugField: serpy.StrField(required=False),
-        models.SmallIntegerField: serpy.IntField(required=False),
-        models.TextField: serpy.StrField(required=False),
-        models.TimeField: serpy.StrField(required=False),
-        models.URLField: serpy.StrField(required=False),
-        models.GenericIPAddressField: serpy.StrField(required=False),
-        models.FilePathField: serpy.StrField(required=False),
-        models.ForeignKey: ForeignKeyField(),
-        models.fields.reverse_related.ManyToOneRel: ForeignKeyField(),
-        models.OneToOneField: ForeignKeyField(),
-        models.fields.related.ManyToManyField: ForeignKeyField(),
-        JSONField: serpy.StrField(required=False),
-    }
-    return model_serpy_map[model_field_type]
+    """
+    Return a new serpy field instance for `model_field_type`. Extra mappings can be provided using
+    the `DRF_AUTO_SERPY_TYPE_MAPPING` setting: {'dotted.path.to.ModelField': 'dotted.path.to.factory'}.
+    """
+    setting = auto_settings.SERPY_TYPE_MAPPING
+    if setting is not _serpy_type_registry['setting']:
+        mapping = dict(SERPY_TYPE_MAPPING)
+        for model_field_path, serpy_field_path in setting.items():
+            mapping[import_string(model_field_path)] = import_string(serpy_field_path)
+        _serpy_type_registry.update({
+            'setting': setting,
+            'mapping': mapping,
+            'resolved': {},
+        })
+
+    resolved = _serpy_type_registry['resolved']
+    if model_field_type not in resolved:
+        mapping = _serpy_type_registry['mapping']
+        for klass in model_field_type.__mro__:
+            if klass in mapping:
+                resolved[model_field_type] = mapping[klass]
+                break
+        else:
+            raise ImproperlyConfigured('No serpy field is registered for {}'.format(model_field_type))
+
+    return resolved[model_field_type]()
 
 
 
@@ -151,7 +233,7 @@ def M2MRelations(field, attr):
     elif attr == 'related_name':
         if field.field.related_model == field.field.model:
             # Case autogen related_name of a model related to itself
-            return eval("field.through.{}.field.remote_field.related_name".format(field.field.remote_field.name))
+            return getattr(field.through, field.field.remote_field.name).field.remote_field.related_name
             # return field.field.model.__name__.lower() + "_set"
 
         elif field.rel.related_name is not None:
@@ -186,52 +268,115 @@ def M2MRelations(field, attr):
         return field.through.__name__ + "Serializer"
 
 
+def get_m2m_descriptors(model, fields):
+    """
+    Describe, once per serializer, the many-to-many fields of `model` (among `fields`) which use
+    an explicit `through` model and are written through a nested serializer.
+    """
+    rv = []
+    for f in model._meta.get_fields():
+        if not f.many_to_many or f.auto_created or f.name not in fields:
+            continue
+        field = getattr(model, f.name)
+        if '_' in M2MRelations(field, 'through_model'):
+            # auto-created through model
+            continue
+        through = field.through
+        fk_name = M2MRelations(field, 'related_field')
+        rv.append({
+            'name': f.name,
+            'through': through,
+            'fk_name': fk_name,
+            'related_name': M2MRelations(field, 'related_name'),
+            'source': M2MRelations(field, 'source'),
+            'fields': [
+                through_field.name
+                for through_field in through._meta.get_fields()
+                if through_field.name not in ('created_at', 'updated_at', fk_name)
+            ],
+            'timestamped': 'updated_at' in [through_field.name
+                                            for through_field in through._meta.get_fields()],
+        })
+    return tuple(rv)
+
+
+def pop_m2m_data(descriptors, validated_data):
+    return [
+        (descriptor, validated_data.pop(descriptor['related_name'], None))
+        for descriptor in descriptors
+    ]
+
+
+def write_m2m_data(descriptor, data, instance):
+    """
+    Synchronize the rows of `descriptor`'s through model pointing to `instance` with `data`
+    using one delete, one bulk_create and one bulk_update.
+    """
+    through = descriptor['through']
+    fk_name = descriptor['fk_name']
+    now = timezone.now()
+
+    to_create = []
+    to_update = []
+    updated_fields = set()
+    for rel_model_instance in data:
+        rel_model_instance = dict(rel_model_instance)
+        related_instance = rel_model_instance.pop('instance', None)
+        if related_instance:
+            for key, value in rel_model_instance.items():
+                setattr(related_instance, key, value)
+            updated_fields.update(rel_model_instance.keys())
+            to_update.append(related_instance)
+        else:
+            rel_model_instance[fk_name] = instance
+            to_create.append(through(**rel_model_instance))
+
+    # Delete subinstances that are not present anymore
+    through.objects.filter(**{fk_name: instance}) \
+        .exclude(id__in=[related_instance.id for related_instance in to_update]) \
+        .delete()
+
+    if to_update:
+        if descriptor['timestamped']:
+            for related_instance in to_update:
+                related_instance.updated_at = now
+            updated_fields.add('updated_at')
+        if hasattr(through.objects, 'bulk_update'):
+            if updated_fields:
+                through.objects.bulk_update(to_update, sorted(updated_fields))
+        else:
+            # Django < 2.2
+            for related_instance in to_update:
+                related_instance.save(update_fields=sorted(updated_fields))
+
+    if to_create:
+        through.objects.bulk_create(to_create)
+
+    if to_update or to_create:
+        # bulk writes don't send post_save
+        model_versions.bump(through)
+
+
 def create(self, validated_data):
     model = self.Meta.model
 
     # 1. Take out from the validated_data all the many to many fields information (it should be stored into the
-    # intermediate model instance) and store it temporarily in auxiliary variables.
-    #for field in [rel]
-    for f in [f for f in model._meta.get_fields() if f.many_to_many and not f.auto_created]:
-        field = eval("model.{}".format(f.name))
-
-        # Assign relfield_data = None
-        exec ("{0}{1} = {2}".format(f.name, "_data", None))  # E.g: ingredients_data = None
-
-        #if validated_data.get(M2MRelations(field, 'related_name'), None) is not None:
-        if M2MRelations(field, 'related_name') in validated_data.keys():
-            exec (
-            "{0}{1} = validated_data.pop('{2}')".format(f.name, "_data", M2MRelations(field, 'related_name')))
-            # E.g:
-            # if validated_data.get("productingredient_set", None) is not None:
-            #    ingredients_data = validated_data.pop('productingredient_set')
-        else:
-            "{0}{1} = None".format(f.name, "_data")
-
-            # 2. Create an instance of the model with the base validated_data
-    model_instance = model.objects.create(**validated_data)
-    # E.g: product = Product.objects.create(**validated_data)
-
-    # 3. For each auxiliary variable, fill the corresponding intermediate model with this information.
-    for f in [f for f in model._meta.get_fields() if f.many_to_many and not f.auto_created]:
-        field = eval("model.{}".format(f.name))
-
-        if vars()[f.name + "_data"] is not None:
-            for rel_model_instance in vars()[f.name + "_data"]:
-                # Import the submodel before calling it.
-                through_model_name = M2MRelations(field, 'through_model')
-                app = model._meta.app_label
-                exec ("from {0}.models import {1}".format(app, through_model_name))
-                exec (
-                "{0}.objects.create({1}={2}, **rel_model_instance)".format(through_model_name,
-                                                                           M2MRelations(field, 'related_field'),
-                                                                           'model_instance'))
-                # E.g:
-                # if ingredients_data is not None:
-                #    for ingredient in ingredients_data:
-                #        ProductIngredient.objects.create(product=product, **ingredient)
-                #        # la comanda **ingredient el que fa es, donat un diccionari, treure-li els corxets i
-                #        # transformar els : en =.
+    # intermediate model instance).
+    m2m_data = pop_m2m_data(self._m2m_descriptors, validated_data)
+
+    with transaction.atomic():
+        # 2. Create an instance of the model with the base validated_data
+        model_instance = model.objects.create(**validated_data)
+
+        # 3. Fill the corresponding intermediate models with this information.
+        # E.g: ProductIngredient.objects.bulk_create([ProductIngredient(product=product, **ingredient), ...])
+        for descriptor, data in m2m_data:
+            if data:
+                descriptor['through'].objects.bulk_create([
+                    descriptor['through'](**dict(rel_model_instance, **{descriptor['fk_name']: model_instance}))
+                    for rel_model_instance in data
+                ])
+                model_versions.bump(descriptor['through'])
 
     return model_instance
 
@@ -240,67 +385,112 @@ def update(self, instance, validated_data):
     model = self.Meta.model
 
     # 1. Pop data from validated.
-    for f in [f for f in model._meta.get_fields() if f.many_to_many and not f.auto_created]:
-        field = eval("model.{}".format(f.name))
-
-        # Assign relfield_data = None
-        exec ("{0}{1} = {2}".format(f.name, "_data", None))  # E.g: ingredients_data = None
-
-        #if validated_data.get(M2MRelations(field, 'related_name'), None) is not None:
-        if M2MRelations(field, 'related_name') in validated_data.keys():
-            exec (
-                "{0}{1} = validated_data.pop('{2}')".format(f.name, "_data", M2MRelations(field, 'related_name')))
-        else:
-            "{0}{1} = None".format(f.name, "_data")
+    m2m_data = pop_m2m_data(self._m2m_descriptors, validated_data)
 
     for item in validated_data:
         if model._meta.get_field(item):
             setattr(instance, item, validated_data[item])
 
-    # 2. Load previous data and either update it with the new one. In case no data existed, create a new record.
-    for f in [f for f in model._meta.get_fields() if f.many_to_many and not f.auto_created]:
-        field = eval("model.{}".format(f.name))
-
-        # Delete subinstances that are not present anymore
-        through_model_name = M2MRelations(field, 'through_model')
-        app = model._meta.app_label
-        exec ("from {0}.models import {1}".format(app, through_model_name))
-        field_queryset = eval("{0}.objects.filter({1}=instance)".format(M2MRelations(field, 'through_model'),
-                                                                        M2MRelations(field, 'related_field')))
-        field_validated_data_ids = [getattr(k['instance'], 'id') for k in
-                                        eval(f.name + "_data") if 'instance' in k.keys()]
-
-        for i in field_queryset:
-            i_id = getattr(i, 'id')
-
-            if i_id not in field_validated_data_ids:
-                exec (
-                    "{0}.objects.filter(id={1}).delete()".format(
-                        M2MRelations(field, 'through_model'),
-                        i_id
-                    )
-                )
+    # 2. Update existing through rows, create the new ones and delete the ones which are not present anymore.
+    with transaction.atomic():
+        for descriptor, data in m2m_data:
+            if data is not None:
+                write_m2m_data(descriptor, data, instance)
 
-        # Set new content for intermediary model
-        if eval(f.name + "_data") is not None:
-            for rel_model_instance in eval(f.name + "_data"):
-                related_instance = rel_model_instance.pop('instance') if 'instance' in rel_model_instance.keys() else None
-                if related_instance:
-                    field_instance = eval("{0}.objects.filter(id={1})".format(
-                        M2MRelations(field, 'through_model'),
-                        related_instance.id)
-                    )
-                    field_instance.update(id=related_instance.id, updated_at=datetime.now(), **rel_model_instance)
-                else:
-                    exec ("{0}.objects.create({1}={2}, **rel_model_instance)".format(
-                        M2MRelations(field, 'through_model'),
-                        M2MRelations(field, 'related_field'),
-                        'instance'))
-
-    instance.save()
+        instance.save()
     return instance
 
 
+def get_instance_id(model, data):
+    """
+    The primary key of the existing instance referenced by nested `data` (if any).
+    """
+    if not isinstance(data, dict) or not data.get('id', None):
+        return None
+    try:
+        return model._meta.pk.to_python(data['id'])
+    except DjangoValidationError:
+        return data['id']
+
+
+class NestedListSerializer(serializers.ListSerializer):
+    """
+    Resolve the instances referenced by the items of a nested list with a single query.
+    """
+
+    def to_internal_value(self, data):
+        model = self.child.Meta.model
+        ids = [instance_id for instance_id in (get_instance_id(model, item) for item in data)
+               if instance_id is not None] if isinstance(data, list) else []
+
+        instances = {}
+        if ids:
+            try:
+                instances = model.objects.in_bulk(ids)
+            except (ValueError, TypeError):
+                pass
+            missing = [instance_id for instance_id in ids if instance_id not in instances]
+            if missing:
+                raise serializers.ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Invalid id(s) for {}: {}'.format(model._meta.verbose_name,
+                                                         ', '.join(str(pk) for pk in missing))
+                    ]
+                })
+
+        self.child._resolved_instances = instances
+        try:
+            return super(NestedListSerializer, self).to_internal_value(data)
+        finally:
+            self.child._resolved_instances = None
+
+
+class RowCacheListSerializer(serializers.ListSerializer):
+    """
+    Keep the representation of each record in the cache and only serialize the records missing from
+    it. Entries are keyed by endpoint, primary key and either the record's `updated_at` or, if the
+    model doesn't have one, the model's data version, as well as the data versions of the related
+    models rendered by the serializer.
+    """
+
+    def get_row_keys(self, records):
+        endpoint = self.child._row_cache_endpoint
+        model = endpoint.model
+        timestamped = 'updated_at' in [field.name for field in model._meta.get_fields()]
+        versions = [model_versions.get(related_model)
+                    for related_model in endpoint.get_cache_models(self.child.__class__)
+                    if not timestamped or related_model is not model]
+        prefix = 'drf_auto_endpoint:rows:{}:{}'.format(endpoint.get_url(), self.child.__class__.__name__)
+        return [
+            make_cache_key(prefix, record.pk, record.updated_at if timestamped else None, versions)
+            for record in records
+        ]
+
+    def to_representation(self, data):
+        records = list(data.all() if isinstance(data, models.Manager) else data)
+        if not all(isinstance(record, models.Model) for record in records):
+            return super(RowCacheListSerializer, self).to_representation(records)
+
+        keys = self.get_row_keys(records)
+        cache = get_cache()
+        cached = cache.get_many(keys)
+
+        rv = []
+        missing = {}
+        for record, key in zip(records, keys):
+            if key in cached:
+                rv.append(cached[key])
+            else:
+                representation = self.child.to_representation(record)
+                missing[key] = representation
+                rv.append(representation)
+
+        if missing:
+            timeout = self.child._row_cache_endpoint.row_cache_timeout
+            cache.set_many(missing, timeout if timeout is not None else auto_settings.ROW_CACHE_TIMEOUT)
+        return rv
+
+
 def to_internal_value(self, data):
     """
     Dict of native values <- Dict of primitive datatypes.
@@ -308,9 +498,13 @@ def to_internal_value(self, data):
     :param data:
     """
     obj = super(self.__class__, self).to_internal_value(data)
-    instance_id = data.get('id', None)
-    if instance_id:
-        obj['instance'] = self.Meta.model.objects.get(id=instance_id)
+    instance_id = get_instance_id(self.Meta.model, data)
+    if instance_id is not None:
+        resolved_instances = getattr(self, '_resolved_instances', None)
+        if resolved_instances is not None:
+            obj['instance'] = resolved_instances[instance_id]
+        else:
+            obj['instance'] = self.Meta.model.objects.get(id=instance_id)
     return obj
 
 
@@ -327,7 +521,8 @@ def related_serializer_factory(endpoint=None, fields=None, base_class=None, mode
 
     meta_attrs = {
         'model': endpoint.model,
-        'fields': fields if fields is not None else endpoint.get_fields_for_serializer()
+        'fields': fields if fields is not None else endpoint.get_fields_for_serializer(),
+        'list_serializer_class': NestedListSerializer,
     }
 
     meta_parents = (object, )
@@ -378,11 +573,16 @@ def serializer_factory(endpoint=None, fields=None, base_class=None, model=None):
     if hasattr(base_class, 'Meta'):
         meta_parents = (base_class.Meta, ) + meta_parents
 
+    if endpoint.row_cache and hasattr(base_class, 'many_init'):
+        meta_attrs['list_serializer_class'] = RowCacheListSerializer
+
     Meta = type('Meta', meta_parents, meta_attrs)
     cls_name = '{}Serializer'.format(endpoint.model.__name__)
     cls_attrs = {
         'Meta': Meta,
     }
+    if endpoint.row_cache:
+        cls_attrs['_row_cache_endpoint'] = endpoint
 
     ######
     # BEGINNING - ADDED CODE
@@ -399,29 +599,17 @@ def serializer_factory(endpoint=None, fields=None, base_class=None, model=None):
     # Special treatment for many to many fields.
     m2m_fields = [f for f in endpoint.model._meta.get_fields() if f.many_to_many and not f.auto_created and
               f.name in meta_attrs['fields']]
-    for f in m2m_fields:
-        field = eval("endpoint.model.{}".format(f.name))
-        try:
-            through_model_name = M2MRelations(field, 'through_model')
-            if '_' not in through_model_name:
-                app = endpoint.model._meta.app_label
-                exec("from {0}.models import {1}".format(app,through_model_name))
-                through_model = eval(through_model_name)
-                through_fields = [
-                    f.name
-                    for f in through_model._meta.get_fields()
-                    if f.name != 'created_at' and f.name != 'updated_at' #and f.name != 'id'
-                       and f.name != M2MRelations(field,'related_field')
-                ]
-                through_fields.append('__str__')
-                SubSerializer = related_serializer_factory(model=through_model, fields = through_fields)
-
-                cls_attrs[field.field.name] = SubSerializer(source=M2MRelations(field, 'related_name'), many=True, required=False, allow_null=True)
-                cls_attrs["create"] = create
-                cls_attrs["update"] = update
-
-        except FieldDoesNotExist:
-            pass
+    m2m_descriptors = get_m2m_descriptors(endpoint.model, meta_attrs['fields'])
+    for descriptor in m2m_descriptors:
+        through_fields = descriptor['fields'] + ['__str__']
+        SubSerializer = related_serializer_factory(model=descriptor['through'], fields=through_fields)
+
+        cls_attrs[descriptor['name']] = SubSerializer(source=descriptor['related_name'], many=True,
+                                                      required=False, allow_null=True)
+    if m2m_descriptors:
+        cls_attrs['_m2m_descriptors'] = m2m_descriptors
+        cls_attrs["create"] = create
+        cls_attrs["update"] = update
 
     ######
     # END - ADDED CODE
@@ -478,12 +666,18 @@ def pagination_factory(endpoint):
     if issubclass(BasePagination, pagination.PageNumberPagination):
         pg_cls_attrs['page_size_query_param'] = getattr(endpoint, 'page_size_query_param', 'page_size')
         for param in ('django_paginator_class', 'page_query_param', 'max_page_size', 'last_page_string',
-                      'page_size'):
+                      'page_size', 'count_strategy', 'count_cap'):
             if getattr(endpoint, param, None) is not None:
                 pg_cls_attrs[param] = getattr(endpoint, param)
     elif issubclass(BasePagination, pagination.LimitOffsetPagination):
         pg_cls_attrs.pop('page_size')
-        for param in ('default_limit', 'limit_query_param', 'offset_query_param', 'max_limit'):
+        for param in ('default_limit', 'limit_query_param', 'offset_query_param', 'max_limit',
+                      'count_strategy', 'count_cap'):
+            if getattr(endpoint, param, None) is not None:
+                pg_cls_attrs[param] = getattr(endpoint, param)
+    elif issubclass(BasePagination, KeysetPagination):
+        pg_cls_attrs['page_size_query_param'] = getattr(endpoint, 'page_size_query_param', 'page_size')
+        for param in ('max_page_size', 'cursor_query_param'):
             if getattr(endpoint, param, None) is not None:
                 pg_cls_attrs[param] = getattr(endpoint, param)
     elif issubclass(BasePagination, pagination.CursorPagination):
@@ -492,9 +686,15 @@ def pagination_factory(endpoint):
                 pg_cls_attrs[param] = getattr(endpoint, param)
     else:
         raise ImproperlyConfigured('base_pagination_class needs to be a subclass of one of the following:'
-                                   'PageNumberPagination, LimitOffsetPagination, CursorPagination')
+                                   'PageNumberPagination, LimitOffsetPagination, CursorPagination, '
+                                   'KeysetPagination')
 
-    return type(pg_cls_name, (BasePagination, ), pg_cls_attrs)
+    bases = (BasePagination, )
+    if 'count_strategy' in pg_cls_attrs or 'count_cap' in pg_cls_attrs:
+        CountStrategyMixin = get_count_strategy_mixin(BasePagination)
+        if not issubclass(BasePagination, CountStrategyMixin):
+            bases = (CountStrategyMixin, ) + bases
+    return type(pg_cls_name, bases, pg_cls_attrs)
 
 
 def filter_factory(endpoint):
@@ -522,37 +722,709 @@ def filter_factory(endpoint):
     return type(cls_name, (base_class, ), cls_attrs)
 
 
+#####################################
+### QUERY PLAN ###
+#####################################
+def get_serializer_fields(serializer):
+    """
+    Return (name, source, field) for each field of a DRF or serpy serializer (class or instance).
+    """
+    if isinstance(serializer, type) and hasattr(serializer, '_field_map'):
+        # serpy
+        return [
+            (name, field.attr or name, field)
+            for name, field in serializer._field_map.items()
+            if not getattr(field, 'call', False)
+        ]
+
+    if isinstance(serializer, type):
+        serializer = serializer()
+    rv = []
+    for name, field in serializer.fields.items():
+        source_attrs = getattr(field, 'source_attrs', None)
+        if not source_attrs:
+            # source='*' or method fields
+            continue
+        rv.append((name, source_attrs[0], field))
+    return rv
+
+
+def get_relations(model):
+    """
+    Relational fields of `model` by the attribute name used to access them on its instances.
+    """
+    relations = {}
+    for model_field in model._meta.get_fields():
+        if not model_field.is_relation or model_field.related_model is None:
+            continue
+        if hasattr(model_field, 'get_accessor_name'):
+            accessor = model_field.get_accessor_name()
+            if accessor is not None:
+                relations[accessor] = model_field
+        else:
+            relations[model_field.name] = model_field
+    return relations
+
+
+def get_lookup_models(model, lookup):
+    """
+    Models traversed by a `select_related` / `prefetch_related` lookup starting from `model`.
+    """
+    rv = []
+    for part in lookup.split('__'):
+        model_field = get_relations(model).get(part, None)
+        if model_field is None:
+            break
+        model = model_field.related_model
+        rv.append(model)
+    return rv
+
+
+def get_query_plan(serializer, model, prefix=''):
+    """
+    Derive the `select_related` and `prefetch_related` lookups needed to render `serializer`
+    for a queryset of `model` without running one query per row and per relation.
+    """
+    select_related = []
+    prefetch_related = []
+    relations = get_relations(model)
+
+    for name, source, field in get_serializer_fields(serializer):
+        model_field = relations.get(source, None)
+        if model_field is None:
+            continue
+        lookup = prefix + source
+
+        nested = None
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        elif isinstance(field, serializers.BaseSerializer):
+            nested = field
+
+        if model_field.many_to_many or model_field.one_to_many:
+            # DRF fields iterate over the related records. serpy fields aren't prefetched: they only
+            # call __str__ on the related manager, which doesn't query the database
+            if isinstance(field, serializers.Field):
+                prefetch_related.append(lookup)
+            if isinstance(nested, serializers.Serializer):
+                nested_select, nested_prefetch = get_query_plan(nested, model_field.related_model,
+                                                                lookup + '__')
+                prefetch_related += nested_select + nested_prefetch
+            continue
+
+        if isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization() and \
+                model_field.concrete:
+            # rendered from the local column
+            continue
+        select_related.append(lookup)
+        if isinstance(nested, serializers.Serializer):
+            nested_select, nested_prefetch = get_query_plan(nested, model_field.related_model,
+                                                            lookup + '__')
+            select_related += nested_select
+            prefetch_related += nested_prefetch
+
+    return tuple(select_related), tuple(prefetch_related)
+
+
+#####################################
+### FAST READ ###
+#####################################
+def get_fast_read_plan(serializer, model, fields=()):
+    """
+    Compile a serpy `serializer` into the list of columns to fetch with `values_list` and, for each
+    rendered field: (name, column index, to_value, required, related model or None).
+    Raise ImproperlyConfigured for fields which can't be read from a column, including those of
+    `fields` (the endpoint's fields) which didn't become serpy fields (eg: `__str__`).
+    """
+    if not hasattr(serializer, '_field_map'):
+        raise ImproperlyConfigured('fast_read is only available for serpy serializers')
+
+    for name in fields:
+        if name not in serializer._field_map:
+            raise ImproperlyConfigured('{}.{} is computed and cannot be used with fast_read, '
+                                       'set include_str to False or remove it from the fields'.format(
+                                           model.__name__, name))
+
+    columns = []
+    plan = []
+    for name, field in serializer._field_map.items():
+        source = field.attr or name
+        if getattr(field, 'call', False) or source == '__str__':
+            raise ImproperlyConfigured('{}.{} is computed and cannot be used with fast_read, '
+                                       'set include_str to False or remove it from the fields'.format(
+                                           model.__name__, name))
+
+        current_model = model
+        for part in source.split('.'):
+            if current_model is None:
+                model_field = None
+            else:
+                try:
+                    model_field = current_model._meta.get_field(part)
+                except FieldDoesNotExist:
+                    model_field = None
+            if model_field is None or not model_field.concrete or model_field.many_to_many:
+                raise ImproperlyConfigured('{}.{} ({}) is not a column and cannot be used with '
+                                           'fast_read'.format(model.__name__, name, source))
+            # only forward relations can be followed
+            current_model = model_field.related_model
+
+        # ForeignKeyField renders the related object's label, other fields render the id
+        related_model = current_model if isinstance(field, ForeignKeyField) else None
+        column = source.replace('.', '__')
+        if column not in columns:
+            columns.append(column)
+
+        to_value = field.to_value if field.__class__.to_value is not serpy.Field.to_value else None
+        plan.append((name, columns.index(column), to_value, field.required, related_model))
+
+    return columns, plan
+
+
+def fast_read_rows(plan, rows):
+    """
+    Render `rows` (tuples returned by `values_list`) according to `plan`, fetching the related
+    objects needed for their labels with one `in_bulk` per relation.
+    """
+    rows = list(rows)
+    related_objects = {}
+    for name, index, to_value, required, related_model in plan:
+        if related_model is not None:
+            ids = set(row[index] for row in rows if row[index] is not None)
+            related_objects[name] = related_model.objects.in_bulk(ids) if ids else {}
+
+    rv = []
+    for row in rows:
+        item = {}
+        for name, index, to_value, required, related_model in plan:
+            value = row[index]
+            if related_model is not None and value is not None:
+                value = related_objects[name].get(value, None)
+            if to_value is not None and (required or value is not None):
+                value = to_value(value)
+            item[name] = value
+        rv.append(item)
+    return rv
+
+
+def fast_list(self, request, *args, **kwargs):
+    columns, plan = self.fast_read_plan
+    queryset = self.filter_queryset(self.get_queryset())
+    queryset = queryset.select_related(None).prefetch_related(None).values_list(*columns)
+
+    page = self.paginate_queryset(queryset)
+    if page is not None:
+        return self.get_paginated_response(fast_read_rows(plan, page))
+    return Response(fast_read_rows(plan, queryset))
+
+
+#####################################
+### STREAMING ###
+#####################################
+def iter_chunks(queryset, chunk_size):
+    """
+    Yield lists of at most `chunk_size` records from `queryset` without caching its results.
+    Prefetched relations are fetched for each chunk.
+    """
+    lookups = getattr(queryset, '_prefetch_related_lookups', ())
+    if lookups:
+        queryset = queryset.prefetch_related(None)
+    try:
+        iterator = queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        # Django < 2.0
+        iterator = queryset.iterator()
+
+    while True:
+        rows = list(islice(iterator, chunk_size))
+        if len(rows) == 0:
+            return
+        if lookups:
+            prefetch_related_objects(rows, *lookups)
+        yield rows
+
+
+def stream_requested(self, request):
+    renderer = request.accepted_renderer
+    if not self.endpoint.stream_list or not isinstance(renderer, JSONRenderer) or renderer.format != 'json':
+        return False
+    return self.paginator is None or request.query_params.get('stream', '').lower() in ('1', 'true')
+
+
+def stream_list(self, request, *args, **kwargs):
+    """
+    Render the whole (filtered) queryset as a JSON array, `stream_chunk_size` records at a time.
+    """
+    renderer = request.accepted_renderer
+    renderer_context = self.get_renderer_context()
+    queryset = self.filter_queryset(self.get_queryset())
+    fast_read_plan = getattr(self, 'fast_read_plan', None)
+    if fast_read_plan is not None:
+        columns, plan = fast_read_plan
+        queryset = queryset.select_related(None).prefetch_related(None).values_list(*columns)
+
+    def content():
+        yield b'['
+        separator = b''
+        for rows in iter_chunks(queryset, self.endpoint.stream_chunk_size):
+            if fast_read_plan is not None:
+                data = fast_read_rows(plan, rows)
+            else:
+                data = self.get_serializer(rows, many=True).data
+            # strip the enclosing brackets
+            chunk = renderer.render(data, request.accepted_media_type, renderer_context).strip()[1:-1]
+            yield separator + chunk
+            separator = b','
+        yield b']'
+
+    return StreamingHttpResponse(content(), content_type=renderer.media_type)
+
+
+def stream_csv(self, request, *args, **kwargs):
+    """
+    Export the whole (filtered) queryset as CSV, `stream_chunk_size` records at a time.
+    Columns can be restricted to some of the serializer's fields with `?fields=name,other_name`.
+    """
+    renderer = request.accepted_renderer
+    columns = get_columns(self, [])
+    if request.query_params.get('fields', None):
+        selected = [column.strip() for column in request.query_params['fields'].split(',')]
+        unknown = [column for column in selected if column not in columns]
+        if unknown:
+            return Response('Unknown field(s): {}'.format(', '.join(unknown)), status=400)
+        columns = selected
+
+    queryset = self.filter_queryset(self.get_queryset())
+    fast_read_plan = getattr(self, 'fast_read_plan', None)
+    if fast_read_plan is not None:
+        values_columns, plan = fast_read_plan
+        plan = [item for item in plan if item[0] in columns]
+        queryset = queryset.select_related(None).prefetch_related(None).values_list(*values_columns)
+
+    def content():
+        yield csv_lines([], columns)
+        for rows in iter_chunks(queryset, self.endpoint.stream_chunk_size):
+            if fast_read_plan is not None:
+                data = fast_read_rows(plan, rows)
+            else:
+                data = self.get_serializer(rows, many=True).data
+            yield csv_lines(data, columns, header=False)
+
+    response = StreamingHttpResponse(content(), content_type='{}; charset={}'.format(renderer.media_type,
+                                                                                  renderer.charset))
+    response['Content-Disposition'] = 'attachment; filename="{}.csv"'.format(
+        self.endpoint.model._meta.model_name)
+    return response
+
+
 #####################################
 ### VIEWSET FACTORY ###
 #####################################
+def get_queryset_method(self):
+    with phase(self, 'get_queryset'):
+        queryset = super(self.__class__, self).get_queryset()
+        if not isinstance(queryset, QuerySet):
+            return queryset
+
+        select_related, prefetch_related = self.endpoint.get_query_plan(self.get_serializer_class())
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+def filter_queryset_method(self, queryset):
+    with phase(self, 'filter_queryset'):
+        return super(self.__class__, self).filter_queryset(queryset)
+
+
+def paginate_queryset_method(self, queryset):
+    with phase(self, 'paginate'):
+        return super(self.__class__, self).paginate_queryset(queryset)
+
+
+def instrumented(method, name):
+    """
+    Account the time and queries of `method` which aren't part of another phase to the phase `name`.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        with phase(self, name):
+            return method(self, request, *args, **kwargs)
+
+    return wrapper
+
+
+def dispatch_method(self, request, *args, **kwargs):
+    """
+    Profile the request when instrumentation is enabled (see `drf_auto_endpoint.instrumentation`).
+    """
+    if not profiling_enabled(self.endpoint):
+        return super(self.__class__, self).dispatch(request, *args, **kwargs)
+
+    self.instrumentation_profile = Profile()
+    with self.instrumentation_profile.recording():
+        response = super(self.__class__, self).dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            with phase(self, 'render'):
+                response.render()
+    report_profile(self, self.request, response, self.instrumentation_profile)
+    return response
+
+
+def get_aggregate_cache_key(self, request):
+    """
+    Key under which the aggregates requested by `request` are cached, None if they shouldn't be.
+    """
+    if not auto_settings.AGGREGATE_CACHE or not self.endpoint.aggregate_cache:
+        return None
+    return make_cache_key(
+        'drf_auto_endpoint:aggregates',
+        self.endpoint.get_url(),
+        get_query_key(request),
+        model_versions.get(self.endpoint.model),
+        get_permission_key(request),
+    )
+
+
+def get_response_cache_key(self, request, **kwargs):
+    """
+    Key under which the response to `request` is cached, None if it shouldn't be.
+    HTML responses aren't cached: they contain the user's name and CSRF token.
+    """
+    endpoint = self.endpoint
+    if not endpoint.response_cache:
+        return None
+    if isinstance(request.accepted_renderer, (BrowsableAPIRenderer, TemplateHTMLRenderer)) or \
+            (request.accepted_media_type or '').startswith('text/html'):
+        return None
+    return make_cache_key(
+        'drf_auto_endpoint:responses',
+        endpoint.get_url(),
+        self.action,
+        sorted(kwargs.items()),
+        get_query_key(request),
+        request.accepted_media_type,
+        get_permission_key(request),
+        [model_versions.get(model) for model in endpoint.get_cache_models(self.get_serializer_class())],
+    )
+
+
+def cached_response(method):
+    """
+    Serve GET responses of `method` from the response cache when the endpoint enables it.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        cache_key = get_response_cache_key(self, request, **kwargs) if request.method == 'GET' else None
+        if cache_key is None:
+            return method(self, request, *args, **kwargs)
+
+        cached = get_cache().get(cache_key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and \
+                hasattr(response, 'add_post_render_callback'):
+            timeout = self.endpoint.response_cache_timeout
+            if timeout is None:
+                timeout = auto_settings.RESPONSE_CACHE_TIMEOUT
+
+            def store(rendered):
+                get_cache().set(cache_key, (rendered.content, rendered['Content-Type']), timeout)
+            response.add_post_render_callback(store)
+        return response
+
+    return wrapper
+
+
+def coalesced_response(method):
+    """
+    Coalesce identical concurrent GET requests to `method`: the first one builds the response, the
+    others wait for it (up to the endpoint's `coalesce_timeout`) and reuse its data instead of
+    filtering, counting and serializing the records again. Streamed responses aren't coalesced.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET' or isinstance(request.accepted_renderer, CSVRenderer) or \
+                stream_requested(self, request):
+            return method(self, request, *args, **kwargs)
+
+        endpoint = self.endpoint
+        key = make_cache_key(
+            'drf_auto_endpoint:coalesce',
+            endpoint.get_url(),
+            self.action,
+            sorted(kwargs.items()),
+            get_query_key(request),
+            request.accepted_media_type,
+            get_permission_key(request),
+        )
+        timeout = endpoint.coalesce_timeout
+        if timeout is None:
+            timeout = auto_settings.COALESCE_TIMEOUT
+
+        response, shared = single_flight.do(key, lambda: method(self, request, *args, **kwargs), timeout)
+        if not shared:
+            return response
+        if not isinstance(response, Response) or response.status_code != 200:
+            return method(self, request, *args, **kwargs)
+        # each request renders its own copy of the response
+        return Response(response.data, status=response.status_code, content_type=response.content_type,
+                        headers={header: value for header, value in response.items()
+                                 if header.lower() != 'content-type'})
+
+    return wrapper
+
+
+def retrieve_method(self, request, *args, **kwargs):
+    return super(self.__class__, self).retrieve(request, *args, **kwargs)
+
+
+def finalize_response_method(self, request, response, *args, **kwargs):
+    response = super(self.__class__, self).finalize_response(request, response, *args, **kwargs)
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        # bulk actions may write without sending any signal
+        model_versions.bump(self.endpoint.model)
+    return response
+
+
+def get_validator_parts(self, request):
+    """
+    What, besides the records themselves, the representations of this viewset depend on.
+    """
+    endpoint = self.endpoint
+    return [
+        endpoint.get_url(),
+        get_query_key(request),
+        request.accepted_media_type,
+        get_permission_key(request),
+        [model_versions.get(model) for model in endpoint.get_cache_models(self.get_serializer_class())
+         if model is not endpoint.model],
+    ]
+
+
+def get_object_validator(self, request, **kwargs):
+    """
+    Return the (ETag, last modified timestamp) of the record requested by `request`. Only its primary
+    key and `updated_at` are fetched.
+    """
+    model = self.endpoint.model
+    lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+    queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None) \
+        .only(model._meta.pk.name, 'updated_at')
+    obj = get_object_or_404(queryset, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+    self.check_object_permissions(request, obj)
+
+    etag = make_digest('retrieve', obj.pk, obj.updated_at, *get_validator_parts(self, request))
+    last_modified = timegm(obj.updated_at.utctimetuple()) if obj.updated_at is not None else None
+    return quote_etag(etag), last_modified
+
+
+def get_list_validator(self, request, **kwargs):
+    """
+    Return the (ETag, None) of the list requested by `request`, derived from the most recent
+    `updated_at` and the number of the filtered records in a single query.
+    Lists don't have a last modified date: deleting a record doesn't change the most recent
+    `updated_at`.
+    """
+    queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+    aggregates = queryset.aggregate(last_updated=Max('updated_at'), count=Count('pk'))
+    etag = make_digest('list', aggregates['last_updated'], aggregates['count'],
+                       *get_validator_parts(self, request))
+    return quote_etag(etag), None
+
+
+def conditional_response(method, get_validator):
+    """
+    Answer conditional GET requests (`If-None-Match`, `If-Modified-Since`) to `method` with
+    304 Not Modified when the validator returned by `get_validator` matches, without building the
+    response.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return method(self, request, *args, **kwargs)
+
+        etag, last_modified = get_validator(self, request, **kwargs)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified is not None and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    return wrapper
+
+
 def list_method(self, request, *args, **kwargs):
     renderer = request.accepted_renderer
 
     if isinstance(renderer, AggregateRenderer):
-        queryset = self.filter_queryset(self.get_queryset())
-        try:
-            data = request.accepted_renderer.render({
-                'queryset': queryset, 'request': request
-            })
-        except AggregateException as e:
-            # Raise other types of aggregate errors
-            return Response(str(e), status=400)
+        cache_key = get_aggregate_cache_key(self, request)
+        data = get_cache().get(cache_key) if cache_key is not None else None
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            try:
+                data = request.accepted_renderer.render({
+                    'queryset': queryset, 'request': request
+                })
+            except AggregateException as e:
+                # Raise other types of aggregate errors
+                return Response(str(e), status=400)
+            if cache_key is not None:
+                get_cache().set(cache_key, data, auto_settings.AGGREGATE_CACHE_TIMEOUT)
         return Response(data, content_type=f'application/json')
-    elif isinstance(renderer, CSVEndpointRenderer):
-    #elif isinstance(renderer, DbRenderer):
-        db_table = self.endpoint.model._meta.db_table
-        data = {'endpoint': self.endpoint, 'request': request}
-        return Response(data, content_type=f'application/csv')
     elif isinstance(renderer, CSVRenderer):
-    #elif isinstance(renderer, FullCSVRenderer):
-        data = {'endpoint': self.endpoint, 'request': request}
-        return Response(data, content_type=f'application/text')
+        return stream_csv(self, request, *args, **kwargs)
+    elif stream_requested(self, request):
+        return stream_list(self, request, *args, **kwargs)
+    elif getattr(self, 'fast_read_plan', None) is not None:
+        return fast_list(self, request, *args, **kwargs)
     return super(self.__class__, self).list(request, *args, **kwargs)
     #return super().list(request, *args, **kwargs)
 
-def viewset_factory(endpoint):
+ACTION_TYPES = ('custom', 'bulk', 'list')
+
+
+def get_endpoint_actions(endpoint):
+    """
+    Actions declared on `endpoint` (using the decorators) that will be copied to its viewset.
+    """
     from .endpoints import BaseEndpoint
 
+    action_names = getattr(endpoint, '_action_names', None)
+    if action_names is None:
+        black_list = dir(BaseEndpoint)
+        action_names = [method_name for method_name in dir(endpoint) if method_name not in black_list]
+
+    rv = {}
+    for method_name in action_names:
+        method = getattr(endpoint, method_name)
+        if getattr(method, 'action_type', None) in ACTION_TYPES:
+            rv[method_name] = method
+    return rv
+
+
+def get_factory_actions(endpoint):
+    """
+    Extra routes added by `viewset_factory` depending on the endpoint's options.
+    """
+    rv = {}
+    if endpoint.lazy_choices:
+        rv['choices'] = choices
+    return rv
+
+
+def build_action_index(endpoint, viewset):
+    """
+    Scan `viewset` once for decorated actions and return what's needed to describe them in
+    the metadata: type, name, verb, extra kwargs and the url name/kwargs to reverse.
+    """
+    rv = []
+    for action_name in dir(viewset):
+        action = getattr(viewset, action_name)
+        action_type = getattr(action, 'action_type', None)
+        if action_type not in ACTION_TYPES:
+            continue
+
+        if action_type == 'custom':
+            url_name = '{}-{}'.format(endpoint.get_url(), action.__name__.lower().replace('_', '-'))
+            url_kwargs = {getattr(viewset, 'lookup_field', 'pk'): ':id'}
+        else:
+            url_name = '{}-{}'.format(endpoint.get_url(), action.__name__.lower())
+            url_kwargs = None
+
+        rv.append({
+            'type': action_type,
+            'name': action.__name__,
+            'verb': get_action_methods(action)[0],
+            'kwargs': action.action_kwargs,
+            'url_name': url_name,
+            'url_kwargs': url_kwargs,
+        })
+    return rv
+
+
+def options_method(self, request, *args, **kwargs):
+    from .metadata import conditional_options
+    return conditional_options(self, request, *args, **kwargs)
+
+
+def choices(self, request, field=None):
+    """
+    Paged list of the choices for a relational field of the endpoint.
+    Accepts `q` (searched in the label field), `limit` and `offset` query parameters.
+    """
+    endpoint = self.endpoint
+    if not applies_to_field(endpoint.lazy_choices, field):
+        raise Http404
+
+    serializer = self.get_serializer()
+    try:
+        field_instance = serializer.fields[field]
+        model_field = endpoint.model._meta.get_field(getattr(field_instance, 'source', field))
+    except (KeyError, FieldDoesNotExist):
+        raise Http404
+    if model_field.related_model is None:
+        raise Http404
+
+    qs, key_attr = get_choices_source(field_instance, model_field, model_field.related_model)
+    label_field = (endpoint.choices_label_fields or {}).get(field, None)
+
+    try:
+        limit = int(request.query_params.get('limit', endpoint.choices_page_size))
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        return Response('limit and offset should be integers', status=400)
+    limit = max(1, min(limit, endpoint.choices_max_page_size))
+    offset = max(0, offset)
+
+    search = request.query_params.get('q', None)
+    if search:
+        if label_field is None:
+            return Response('choices for {} can only be searched when a label field is defined in '
+                            'choices_label_fields'.format(field), status=400)
+        qs = qs.filter(**{'{}__icontains'.format(label_field): search})
+
+    if not qs.ordered:
+        qs = qs.order_by(*[attr for attr in (label_field, key_attr) if attr is not None])
+
+    if label_field is not None:
+        choices = [
+            {
+                'label': label,
+                'value': value,
+            } for value, label in qs.values_list(key_attr, label_field)[offset:offset + limit + 1]
+        ]
+    else:
+        choices = [
+            {
+                'label': record.__str__(),
+                'value': getattr(record, key_attr),
+            } for record in qs[offset:offset + limit + 1]
+        ]
+
+    return Response({
+        'results': choices[:limit],
+        'more': len(choices) > limit,
+    })
+
+
+if action is not None:
+    choices = action(methods=['get'], detail=False, url_path=r'choices/(?P<field>[^/.]+)',
+                     url_name='choices')(choices)
+else:
+    choices = list_route(methods=['get'], url_path=r'choices/(?P<field>[^/.]+)')(choices)
+
+
+def viewset_factory(endpoint):
     base_viewset = endpoint.get_base_viewset()
     cls_name = '{}ViewSet'.format(endpoint.model.__name__)
     tmp_cls_attrs = {
@@ -623,20 +1495,48 @@ def viewset_factory(endpoint):
     if len(filter_backends) > 0:
         cls_attrs['filter_backends'] = filter_backends
 
+    renderer_classes = list(getattr(base_viewset, 'renderer_classes', api_settings.DEFAULT_RENDERER_CLASSES))
+    for renderer_class in (ColumnarJSONRenderer, CSVRenderer):
+        if renderer_class not in renderer_classes:
+            renderer_classes.append(renderer_class)
+    cls_attrs['renderer_classes'] = renderer_classes
+
     if hasattr(endpoint, 'pagination_class'):
         cls_attrs['pagination_class'] = endpoint.pagination_class
     else:
         cls_attrs['pagination_class'] = pagination_factory(endpoint)
 
-    cls_attrs['list'] = list_method
+    list_action = instrumented(list_method, 'serialize')
+    retrieve_action = instrumented(retrieve_method, 'serialize')
+    if endpoint.response_cache:
+        list_action, retrieve_action = cached_response(list_action), cached_response(retrieve_action)
+        cls_attrs['finalize_response'] = finalize_response_method
+    if endpoint.coalesce_list:
+        list_action = coalesced_response(list_action)
+    if endpoint.has_conditional_get():
+        list_action = conditional_response(list_action, get_list_validator)
+        retrieve_action = conditional_response(retrieve_action, get_object_validator)
+    cls_attrs['list'] = list_action
+    if hasattr(base_viewset, 'retrieve'):
+        cls_attrs['retrieve'] = retrieve_action
+    cls_attrs['get_queryset'] = get_queryset_method
+    cls_attrs['filter_queryset'] = filter_queryset_method
+    cls_attrs['paginate_queryset'] = paginate_queryset_method
+    cls_attrs['dispatch'] = dispatch_method
+    if endpoint.fast_read:
+        if not endpoint.read_only:
+            raise ImproperlyConfigured('fast_read is only available for read_only endpoints')
+        cls_attrs['fast_read_plan'] = get_fast_read_plan(endpoint.get_serializer(), endpoint.model,
+                                                         endpoint.get_fields_for_serializer())
+    if base_viewset.options is APIView.options:
+        cls_attrs['options'] = options_method
+    cls_attrs.update(get_factory_actions(endpoint))
 
     rv = type(cls_name, (endpoint.get_base_viewset(),), cls_attrs)
 
-    black_list = dir(BaseEndpoint)
-    for method_name in dir(endpoint):
-        if method_name not in black_list:
-            method = getattr(endpoint, method_name)
-            if getattr(method, 'action_type', None) in ['custom', 'bulk', 'list']:
-                setattr(rv, method_name, method)
+    for method_name, method in get_endpoint_actions(endpoint).items():
+        setattr(rv, method_name, method)
+
+    endpoint._action_index = build_action_index(endpoint, rv)
 
     return rv
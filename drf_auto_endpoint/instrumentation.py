@@ -0,0 +1,172 @@
+import logging
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings as django_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .app_settings import settings
+
+
+logger = logging.getLogger('drf_auto_endpoint')
+
+QUERY_BUDGET_ACTIONS = ('log', 'raise')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Profile(object):
+    """
+    Number of SQL queries, SQL time and wall time (in seconds) spent in each phase of a request.
+
+    Phases can be nested, the queries and time of a phase don't include those of the phases
+    started inside of it. Everything outside of any phase is accounted to 'other'.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.queries = 0
+        self.sql_time = 0
+        self._stack = []
+        self._start = None
+        self._wall_time = None
+
+    def get_stats(self, name):
+        if name not in self.phases:
+            self.phases[name] = {'queries': 0, 'sql_time': 0, 'wall_time': 0}
+        return self.phases[name]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            stats = self.get_stats(self._stack[-1][0] if self._stack else 'other')
+            stats['queries'] += 1
+            stats['sql_time'] += duration
+
+    @contextmanager
+    def recording(self):
+        """
+        Record the queries sent to any database while the context is active.
+        """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            self._start = perf_counter()
+            try:
+                yield self
+            finally:
+                self._wall_time = perf_counter() - self._start
+
+    @contextmanager
+    def phase(self, name):
+        frame = [name, perf_counter(), 0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            duration = perf_counter() - frame[1]
+            self.get_stats(name)['wall_time'] += duration - frame[2]
+            if self._stack:
+                self._stack[-1][2] += duration
+
+    @property
+    def wall_time(self):
+        if self._wall_time is not None:
+            return self._wall_time
+        return perf_counter() - self._start
+
+    def get_report(self):
+        rv = OrderedDict((name, dict(stats)) for name, stats in self.phases.items())
+        other = rv.pop('other', {'queries': 0, 'sql_time': 0})
+        other['wall_time'] = max(self.wall_time - sum(stats['wall_time'] for stats in rv.values()), 0)
+        rv['other'] = other
+        rv['total'] = {'queries': self.queries, 'sql_time': self.sql_time, 'wall_time': self.wall_time}
+        return rv
+
+
+@contextmanager
+def phase(view, name):
+    """
+    Account what happens in the context to the phase `name` of the request `view` is handling,
+    if that request is being profiled.
+    """
+    profile = getattr(view, 'instrumentation_profile', None)
+    if profile is None:
+        yield
+    else:
+        with profile.phase(name):
+            yield
+
+
+def get_sink():
+    sink = settings.INSTRUMENTATION_SINK
+    if isinstance(sink, str):
+        sink = import_string(sink)
+    return sink
+
+
+def profiling_enabled(endpoint):
+    return django_settings.DEBUG or settings.INSTRUMENTATION_SINK is not None or \
+        getattr(endpoint, 'query_budget', None) is not None
+
+
+def get_server_timing(report):
+    return ', '.join(
+        '{};dur={:.2f};desc="{} queries, {:.2f}ms SQL"'.format(
+            name, stats['wall_time'] * 1000, stats['queries'], stats['sql_time'] * 1000
+        ) for name, stats in report.items()
+    )
+
+
+def check_query_budget(endpoint, request, report):
+    budget = getattr(endpoint, 'query_budget', None)
+    queries = report['total']['queries']
+    if budget is None or queries <= budget:
+        return
+
+    action = getattr(endpoint, 'query_budget_action', None) or settings.QUERY_BUDGET_ACTION
+    if action not in QUERY_BUDGET_ACTIONS:
+        raise ImproperlyConfigured('query_budget_action should be one of {}'.format(
+            ', '.join(QUERY_BUDGET_ACTIONS)))
+    message = '{} {} ran {} queries, the budget of {} is {} ({})'.format(
+        request.method,
+        request.get_full_path(),
+        queries,
+        endpoint.get_url(),
+        budget,
+        ', '.join('{}: {}'.format(name, stats['queries']) for name, stats in report.items()
+                  if name != 'total')
+    )
+    if action == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def report_profile(view, request, response, profile):
+    """
+    Expose the report of `profile` as a `Server-Timing` header (in debug mode), push it to the
+    `DRF_AUTO_INSTRUMENTATION_SINK` and check it against the endpoint's query budget.
+    """
+    report = profile.get_report()
+    endpoint = getattr(view, 'endpoint', None)
+
+    if django_settings.DEBUG:
+        response['Server-Timing'] = get_server_timing(report)
+        response['X-Query-Count'] = report['total']['queries']
+
+    sink = get_sink()
+    if sink is not None:
+        sink(view, request, response, report)
+
+    check_query_budget(endpoint, request, report)
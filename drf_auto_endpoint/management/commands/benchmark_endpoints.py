@@ -0,0 +1,41 @@
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = 'Compare the time needed to build registered endpoints eagerly and lazily'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--router', default='drf_auto_endpoint.router.router',
+                            help='Defaults to drf_auto_endpoint.router.router')
+        parser.add_argument('--repeat', default=5, type=int,
+                            help='Number of times each measure is taken, the best one is reported')
+
+    def measure(self, endpoints, repeat, lazy, first_use=False):
+        best = None
+        with override_settings(DRF_AUTO_LAZY_ENDPOINTS=lazy):
+            for __ in range(repeat):
+                start = default_timer()
+                for endpoint in endpoints:
+                    instance = endpoint.__class__(model=endpoint.model)
+                    if first_use:
+                        # what the first request to the endpoint will have to build
+                        instance.get_viewset()
+                elapsed = default_timer() - start
+                best = elapsed if best is None else min(best, elapsed)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        router = import_string(options['router'])
+        endpoints = list(getattr(router, '_endpoints', {}).values())
+        repeat = max(options['repeat'], 1)
+
+        self.stdout.write('{} endpoints, best of {}'.format(len(endpoints), repeat))
+        self.stdout.write('eager startup:    {:.2f}ms'.format(self.measure(endpoints, repeat, False)))
+        self.stdout.write('lazy startup:     {:.2f}ms'.format(self.measure(endpoints, repeat, True)))
+        self.stdout.write('lazy + first use: {:.2f}ms'.format(
+            self.measure(endpoints, repeat, True, first_use=True)
+        ))
@@ -1,47 +1,152 @@
 from collections import defaultdict
+import hashlib
+import json
 
+from django.utils.http import parse_etags, quote_etag
 from django.utils.module_loading import import_string
+from django.utils.translation import get_language
 
+from rest_framework import status
 from rest_framework.metadata import SimpleMetadata, BaseMetadata
+from rest_framework.response import Response
 
-from .utils import get_languages, get_field_dict
+from .utils import get_languages, get_field_dict, get_field_dicts
 from .app_settings import settings
 from .adapters import GETTER
+from .cache import metadata_cache, invalidate_metadata_cache, get_permission_key  # NoQA
+from .instrumentation import phase
+
+
+_adapter_classes = {}
+
+
+def get_adapter_class():
+    path = settings.METADATA_ADAPTER
+    if path not in _adapter_classes:
+        _adapter_classes[path] = import_string(path)
+    return _adapter_classes[path]
+
+
+def etag_matches(etag, request):
+    """
+    Whether `etag` is one of the entity tags listed in the If-None-Match header of `request`.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH', None)
+    if not header:
+        return False
+    etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(header)]
+    return '*' in etags or etag in etags or etag.strip('"') in etags
+
+
+def conditional_options(view, request, *args, **kwargs):
+    """
+    Answer an OPTIONS request, sending an ETag built from the metadata fingerprint and
+    replying `304 Not Modified` when the client already holds the same document.
+    """
+    if view.metadata_class is None:
+        return view.http_method_not_allowed(request, *args, **kwargs)
+
+    metadata_class = view.metadata_class()
+    data = metadata_class.determine_metadata(request, view)
+    fingerprint = getattr(metadata_class, 'fingerprint', None)
+    if fingerprint is None:
+        return Response(data, status=status.HTTP_200_OK)
+
+    etag = quote_etag(fingerprint)
+    if etag_matches(etag, request):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data, status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    return response
+
+
+class ConditionalMetadataMixin(object):
+    """
+    View mixin answering OPTIONS requests conditionally (see `conditional_options`).
+    Viewsets generated by `viewset_factory` already behave this way.
+    """
+
+    def options(self, request, *args, **kwargs):
+        return conditional_options(self, request, *args, **kwargs)
 
 
 class AutoMetadataMixin(object):
 
+    fingerprint = None
+
+    def get_fingerprint(self, metadata):
+        """
+        Stable hash of an adapted metadata document, the adapter and the active language.
+        """
+        payload = json.dumps([settings.METADATA_ADAPTER, get_language(), metadata],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
     def root_metadata(self, metadata, view):
         from .router import router
-        rv = {
-            'endpoints': [k for k in router._endpoints.keys()]
-        }
-
-        applications = defaultdict(lambda: [])
-        for url, endpoint in router._endpoints.items():
-            if endpoint.list_me:
-                applications[endpoint.application_name].append({
-                    'name': endpoint.model_name,
-                    'singular': endpoint.singular_model_name,
-                    'endpoint': url
-                })
-        rv['applications'] = [
-            {
-                'name': k,
-                'models': v
-            } for k, v in applications.items()
-
-        ]
+        if hasattr(router, 'get_root_metadata'):
+            rv = router.get_root_metadata()
+        else:
+            rv = {
+                'endpoints': [k for k in router._endpoints.keys()]
+            }
+
+            applications = defaultdict(lambda: [])
+            for url, endpoint in router._endpoints.items():
+                if endpoint.list_me:
+                    applications[endpoint.application_name].append({
+                        'name': endpoint.model_name,
+                        'singular': endpoint.singular_model_name,
+                        'endpoint': url
+                    })
+            rv['applications'] = [
+                {
+                    'name': k,
+                    'models': v
+                } for k, v in applications.items()
+
+            ]
         rv['languages'] = get_languages()
 
-        adapter = import_string(settings.METADATA_ADAPTER)()
+        adapter = get_adapter_class()()
         metadata.update(adapter.render_root(rv))
+        self.fingerprint = self.get_fingerprint(metadata)
         return metadata
 
     def get_field_dict(self, *args, **kwargs):
         return get_field_dict(*args, **kwargs)
 
+    def get_field_dicts(self, *args, **kwargs):
+        return get_field_dicts(*args, **kwargs)
+
+    def get_metadata_cache_key(self, request, view):
+        return (
+            self.__class__,
+            settings.METADATA_ADAPTER,
+            get_language(),
+            get_permission_key(request),
+        )
+
+    def can_cache_metadata(self, endpoint):
+        # inlined choices are only dropped along with the documents embedding them by the choices cache
+        return settings.CHOICES_CACHE or not hasattr(endpoint, 'inlines_choices') or \
+            not endpoint.inlines_choices()
+
     def determine_metadata(self, request, view):
+        with phase(view, 'metadata'):
+            return self.build_metadata(request, view)
+
+    def build_metadata(self, request, view):
+
+        cache_key = None
+        endpoint = getattr(view, 'endpoint', None)
+        if endpoint is not None and settings.METADATA_CACHE and self.can_cache_metadata(endpoint):
+            cache_key = self.get_metadata_cache_key(request, view)
+            cached = metadata_cache.get(endpoint, cache_key)
+            if cached is not None:
+                rv, self.fingerprint = cached
+                return rv
 
         try:
              metadata = super(AutoMetadataMixin, self).determine_metadata(request, view)
@@ -69,9 +174,9 @@ class AutoMetadataMixin(object):
                 from .endpoints import Endpoint
                 endpoint = Endpoint(serializer.Meta.model, viewset=view)
 
-        adapter = import_string(settings.METADATA_ADAPTER)()
+        adapter = get_adapter_class()()
         if endpoint is None:
-            fields_metadata = []
+            field_names = []
 
             for field in serializer_instance.fields.keys():
                 if field in {'id', '__str__'}:
@@ -83,24 +188,23 @@ class AutoMetadataMixin(object):
                 if type_ is None:
                     raise NotImplementedError()
 
-                field_metadata = self.get_field_dict(field, serializer)
-
-                fields_metadata.append(field_metadata)
-
-                for meta_info in adapter.metadata_info:
-                    if meta_info.attr == 'fields':
-                        metadata['fields'] = fields_metadata,
-                    elif meta_info.attr == 'fieldsets':
-                        metadata['fieldsets'] = [{
-                            'title': None,
-                            'fields': [
-                                {'key': field}
-                                for field in serializer_instance.fields.keys()
-                                if field != 'id' and field != '__str__'
-                            ]
-                        }]
-                    else:
-                        metadata[meta_info.attr] = meta_info.default
+                field_names.append(field)
+
+            fields_metadata = self.get_field_dicts(field_names, serializer_instance)
+
+            for meta_info in adapter.metadata_info:
+                if meta_info.attr == 'fields':
+                    metadata['fields'] = fields_metadata
+                elif meta_info.attr == 'fieldsets':
+                    metadata['fieldsets'] = [{
+                        'title': None,
+                        'fields': [
+                            {'key': field}
+                            for field in field_names
+                        ]
+                    }]
+                else:
+                    metadata[meta_info.attr] = meta_info.default
         else:
             for meta_info in adapter.metadata_info:
                 try:
@@ -115,7 +219,11 @@ class AutoMetadataMixin(object):
                 except AttributeError:
                     metadata[meta_info.attr] = meta_info.default
 
-        return adapter(metadata)
+        rv = adapter(metadata)
+        self.fingerprint = self.get_fingerprint(rv)
+        if cache_key is not None:
+            metadata_cache.set(endpoint, cache_key, (rv, self.fingerprint))
+        return rv
 
 
 class AutoMetadata(AutoMetadataMixin, SimpleMetadata):
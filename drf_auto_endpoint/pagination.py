@@ -0,0 +1,431 @@
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from math import ceil
+
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Model, Q
+from django.utils.functional import cached_property
+
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+COUNT_STRATEGIES = ('exact', 'capped', 'estimated', 'none')
+
+
+def estimate_count(queryset):
+    """
+    Number of rows the database planner expects `queryset` to return, None if the database backend
+    doesn't provide estimates.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+    if not isinstance(plan, list):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_count(object_list, strategy, cap):
+    """
+    Return (count, capped) for `object_list` according to `strategy`.
+    """
+    if strategy not in COUNT_STRATEGIES:
+        raise ImproperlyConfigured('count_strategy should be one of {}'.format(', '.join(COUNT_STRATEGIES)))
+
+    if strategy == 'none':
+        return None, False
+    if not hasattr(object_list, 'count') or isinstance(object_list, (list, tuple)):
+        return len(object_list), False
+
+    if strategy == 'capped':
+        count = object_list[:cap + 1].count()
+        return min(count, cap), count > cap
+    if strategy == 'estimated':
+        count = estimate_count(object_list)
+        if count is not None:
+            return count, False
+    return object_list.count(), False
+
+
+class UncountedPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super(UncountedPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Paginator which doesn't rely on an exact count unless `count_strategy` is 'exact'.
+    Other strategies fetch one extra record to know whether there is a next page.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 count_strategy='exact', count_cap=1000):
+        super(CountStrategyPaginator, self).__init__(object_list, per_page, orphans,
+                                                     allow_empty_first_page)
+        self.count_strategy = count_strategy
+        self.count_cap = count_cap
+        self.count_capped = False
+        self._last_number = None
+
+    @cached_property
+    def count(self):
+        count, self.count_capped = get_count(self.object_list, self.count_strategy, self.count_cap)
+        return count
+
+    @cached_property
+    def num_pages(self):
+        if self.count_strategy == 'exact':
+            return super(CountStrategyPaginator, self).num_pages
+        if self.count is not None:
+            pages = int(ceil(self.count / float(self.per_page)))
+        else:
+            pages = 1
+        if self._last_number is not None:
+            pages = max(pages, self._last_number)
+        return max(pages, 1)
+
+    def validate_number(self, number):
+        if self.count_strategy == 'exact':
+            return super(CountStrategyPaginator, self).validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.count_strategy == 'exact':
+            return super(CountStrategyPaginator, self).page(number)
+
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        records = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if len(records) == 0 and number > 1:
+            raise EmptyPage('That page contains no results')
+        has_next = len(records) > self.per_page
+        self._last_number = number + 1 if has_next else number
+        return UncountedPage(records[:self.per_page], number, self, has_next)
+
+
+def get_count_display(count, capped, cap):
+    if capped:
+        return '{}+'.format(cap)
+    return count
+
+
+class CountStrategyMixin(object):
+    """
+    Count strategies for paginated responses:
+
+    - 'exact': `COUNT(*)` on every request (default)
+    - 'capped': count up to `count_cap` records, more are reported as `"<count_cap>+"`
+    - 'estimated': the database planner's estimate (PostgreSQL only, exact elsewhere)
+    - 'none': no count, `count` is omitted from responses
+    """
+
+    count_strategy = 'exact'
+    count_cap = 1000
+
+    def set_count(self, response, count, capped):
+        if self.count_strategy == 'none':
+            response.data.pop('count', None)
+        else:
+            response.data['count'] = get_count_display(count, capped, self.count_cap)
+        return response
+
+
+class CountStrategyPageNumberMixin(CountStrategyMixin):
+
+    @property
+    def last_page_strings(self):
+        # the last page can't be located without an exact count
+        if self.count_strategy == 'exact':
+            return super(CountStrategyPageNumberMixin, self).last_page_strings
+        return ()
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        return CountStrategyPaginator(object_list, per_page, count_strategy=self.count_strategy,
+                                      count_cap=self.count_cap, **kwargs)
+
+    def get_paginated_response(self, data):
+        response = super(CountStrategyPageNumberMixin, self).get_paginated_response(data)
+        paginator = self.page.paginator
+        return self.set_count(response, paginator.count, paginator.count_capped)
+
+
+class CountStrategyLimitOffsetMixin(CountStrategyMixin):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.count_strategy == 'exact':
+            return super(CountStrategyLimitOffsetMixin, self).paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+
+        records = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(records) > self.limit
+        self.count, self.count_capped = get_count(queryset, self.count_strategy, self.count_cap)
+        if self.count is not None and self.has_next:
+            # estimates can be too low
+            self.count = max(self.count, self.offset + len(records))
+        return records[:self.limit]
+
+    def get_next_link(self):
+        if self.count_strategy == 'exact':
+            return super(CountStrategyLimitOffsetMixin, self).get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        response = super(CountStrategyLimitOffsetMixin, self).get_paginated_response(data)
+        if self.count_strategy == 'exact':
+            return response
+        return self.set_count(response, self.count, self.count_capped)
+
+
+def get_count_strategy_mixin(base_pagination_class):
+    if issubclass(base_pagination_class, pagination.PageNumberPagination):
+        return CountStrategyPageNumberMixin
+    if issubclass(base_pagination_class, pagination.LimitOffsetPagination):
+        return CountStrategyLimitOffsetMixin
+    return None
+
+
+def is_nullable(model, lookup):
+    """
+    Whether the values of `lookup` (eg: `category__name`) can be NULL. Annotations are assumed to be.
+    """
+    for part in lookup.split('__'):
+        if model is None:
+            return True
+        try:
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return True
+        if getattr(field, 'null', True) or field.one_to_many or field.many_to_many:
+            return True
+        model = field.related_model
+    return False
+
+
+def get_seek_filter(ordering, values, reverse=False, nullable=None):
+    """
+    Filter selecting the records which come after `values` (before them if `reverse`) when ordered
+    by `ordering`: `a > va OR (a = va AND b > vb) OR ...`.
+
+    NULLs are considered greater than any other value, as ordered by `get_order_by`. `nullable`
+    tells which fields of `ordering` can be NULL (all of them if it's None).
+    """
+    rv = None
+    equal = Q()
+    for index, (field, value) in enumerate(zip(ordering, values)):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        if value is None:
+            # only non-NULL values come after NULLs, in descending order
+            after = Q(**{'{}__isnull'.format(name): False}) if descending else None
+            current = Q(**{'{}__isnull'.format(name): True})
+        else:
+            after = Q(**{'{}__{}'.format(name, 'lt' if descending else 'gt'): value})
+            if not descending and (nullable is None or nullable[index]):
+                after |= Q(**{'{}__isnull'.format(name): True})
+            current = Q(**{name: value})
+
+        if after is not None:
+            branch = equal & after
+            rv = branch if rv is None else rv | branch
+        equal &= current
+    return rv if rv is not None else Q(pk__in=[])
+
+
+def get_order_by(ordering, reverse=False, nullable=None):
+    """
+    `order_by` arguments for `ordering` (reversed if `reverse`) sorting NULLs after any other value
+    of the nullable fields, whatever the database.
+    """
+    rv = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        if nullable is not None and not nullable[index]:
+            rv.append('-' + name if descending else name)
+        elif descending:
+            rv.append(F(name).desc(nulls_first=True))
+        else:
+            rv.append(F(name).asc(nulls_last=True))
+    return rv
+
+
+def get_ordering_value(obj, field):
+    value = obj
+    for part in field.lstrip('-').split('__'):
+        if value is None:
+            break
+        value = getattr(value, part)
+    if isinstance(value, Model):
+        value = value.pk
+    return value
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keep the microseconds of datetimes and times, which `DjangoJSONEncoder` truncates to milliseconds:
+    seeking from a truncated value would return the same rows again (or skip some).
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super(CursorEncoder, self).default(o)
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Seek pagination: each page is selected with a filter on the values of the last record of the
+    previous page instead of an offset, so deep pages cost as much as the first one.
+
+    Records are ordered by the queryset's ordering (eg: the one applied by `OrderingFilter`) with the
+    primary key as tie breaker so the ordering is unique. Pages are addressed by opaque cursors in the
+    `next` and `previous` links.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = None
+    max_page_size = None
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    if self.max_page_size:
+                        return min(page_size, self.max_page_size)
+                    return page_size
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering) or '?' in ordering:
+            # expressions and random orderings can't be sought
+            ordering = []
+
+        rv = []
+        for field in ordering:
+            name = field.lstrip('-')
+            try:
+                model_field = queryset.model._meta.get_field(name)
+                if model_field.is_relation and model_field.concrete:
+                    # order by the column, not by the related model's ordering
+                    name = model_field.attname
+            except FieldDoesNotExist:
+                pass
+            rv.append(field[:len(field) - len(field.lstrip('-'))] + name)
+
+        pk_names = ('pk', queryset.model._meta.pk.name, queryset.model._meta.pk.attname)
+        if not any(field.lstrip('-') in pk_names for field in rv):
+            rv.append('pk')
+        return rv
+
+    def encode_cursor(self, direction, values):
+        cursor = json.dumps({'d': direction, 'o': self.ordering, 'v': values}, cls=CursorEncoder)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii'))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            direction, ordering, values = cursor['d'], cursor['o'], cursor['v']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('next', 'previous') or ordering != self.ordering or \
+                not isinstance(values, list) or len(values) != len(ordering) or \
+                not all(value is None or isinstance(value, (str, int, float)) for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return direction, values
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        nullable = [is_nullable(queryset.model, field.lstrip('-')) for field in self.ordering]
+        cursor = self.decode_cursor(request)
+
+        reverse = cursor is not None and cursor[0] == 'previous'
+        queryset = queryset.order_by(*get_order_by(self.ordering, reverse, nullable))
+        try:
+            if cursor is not None:
+                queryset = queryset.filter(get_seek_filter(self.ordering, cursor[1], reverse, nullable))
+            records = list(queryset[:self.page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            # values which can't be compared to the fields they come from
+            raise NotFound(self.invalid_cursor_message)
+        has_more = len(records) > self.page_size
+        records = records[:self.page_size]
+        if reverse:
+            records.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = records
+        return records
+
+    def get_values(self, obj):
+        return [get_ordering_value(obj, field) for field in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next or len(self.page) == 0:
+            return None
+        return self.encode_cursor('next', self.get_values(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if len(self.page) == 0:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor('previous', self.get_values(self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
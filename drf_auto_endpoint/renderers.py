@@ -0,0 +1,132 @@
+import csv
+import json
+from io import StringIO
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+def get_columns(view, rows):
+    """
+    Field names of the view's serializer, in order. Fall back to the keys of the first row.
+    """
+    get_serializer_class = getattr(view, 'get_serializer_class', None)
+    if get_serializer_class is not None:
+        try:
+            serializer_class = get_serializer_class()
+        except AssertionError:
+            serializer_class = None
+        if hasattr(serializer_class, '_field_map'):
+            # serpy
+            return list(serializer_class._field_map.keys())
+        if serializer_class is not None:
+            columns = list(serializer_class().fields.keys())
+            if len(rows) == 0 or set(rows[0].keys()) == set(columns):
+                return columns
+    return list(rows[0].keys()) if len(rows) > 0 else []
+
+
+def to_columnar(rows, columns, orient='rows'):
+    if orient == 'columns':
+        return {
+            'columns': columns,
+            'values': [[row.get(column, None) for row in rows] for column in columns],
+        }
+    return {
+        'columns': columns,
+        'rows': [[row.get(column, None) for column in columns] for row in rows],
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Render lists of records without repeating the field names in each record:
+    `{"columns": [...], "rows": [[...], ...]}`.
+
+    The column-major variant, `{"columns": [...], "values": [[...], ...]}` with one list per column,
+    is selected with `?orient=columns` or the `orient=columns` media type parameter.
+    Paginated responses keep their envelope, only `results` is transformed. Anything which isn't a
+    list of records is rendered as regular JSON.
+    """
+
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+
+    def get_orient(self, accepted_media_type, renderer_context):
+        request = renderer_context.get('request', None)
+        orient = getattr(request, 'query_params', {}).get('orient', None) if request is not None else None
+        if orient is None and accepted_media_type:
+            for param in accepted_media_type.split(';')[1:]:
+                key, __, value = param.partition('=')
+                if key.strip() == 'orient':
+                    orient = value.strip()
+        return 'columns' if orient == 'columns' else 'rows'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response', None)
+        if response is None or response.status_code < 400:
+            rows = data
+            if isinstance(data, dict) and isinstance(data.get('results', None), list):
+                rows = data['results']
+            if isinstance(rows, list) and all(isinstance(row, dict) for row in rows):
+                columnar = to_columnar(
+                    rows,
+                    get_columns(renderer_context.get('view', None), rows),
+                    self.get_orient(accepted_media_type, renderer_context)
+                )
+                if rows is data:
+                    data = columnar
+                else:
+                    data = dict(data, results=columnar)
+
+        return super(ColumnarJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+
+def to_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def csv_lines(rows, columns, header=True):
+    """
+    Render `rows` (dicts) as CSV text, restricted to `columns`.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([[to_csv_value(row.get(column, None)) for column in columns] for row in rows])
+    return buffer.getvalue()
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Render records as CSV, one line per record preceded by a header line.
+
+    List actions of generated viewsets don't go through `render`: they stream the (filtered)
+    queryset in chunks instead (see `stream_csv` in `drf_auto_endpoint.factories`).
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None:
+            return ''
+        rows = data
+        if isinstance(data, dict):
+            rows = data['results'] if isinstance(data.get('results', None), list) else [data]
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            rows = [{'detail': data}]
+
+        response = renderer_context.get('response', None)
+        if response is not None and response.status_code >= 400:
+            columns = list(rows[0].keys()) if len(rows) > 0 else []
+        else:
+            columns = get_columns(renderer_context.get('view', None), rows)
+        return csv_lines(rows, columns)
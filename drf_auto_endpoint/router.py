@@ -1,4 +1,7 @@
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from copy import deepcopy
+from threading import Lock
+from types import MappingProxyType
 
 from django.utils.module_loading import import_string
 
@@ -6,17 +9,189 @@ from rest_framework.routers import DefaultRouter
 
 from .endpoints import Endpoint
 from .app_settings import settings
+from .factories import get_endpoint_actions, get_factory_actions
+from .metadata import ConditionalMetadataMixin
+from .utils import is_extra_action
+
+
+class LazyView(object):
+    """
+    View returned by `LazyViewSet.as_view`, the actual view is only created on first call.
+    """
+
+    csrf_exempt = True
+
+    def __init__(self, lazy_viewset, actions, initkwargs):
+        self.lazy_viewset = lazy_viewset
+        self.actions = actions
+        self.initkwargs = initkwargs
+        self.__name__ = lazy_viewset.__name__
+        self.__module__ = lazy_viewset.__module__
+        self._view = None
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = self.lazy_viewset.materialize().as_view(self.actions, **self.initkwargs)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.view(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.view, name)
+
+
+class LazyViewSet(object):
+    """
+    Stand-in registered on the router instead of the viewset of an endpoint when
+    `DRF_AUTO_LAZY_ENDPOINTS` is enabled.
+
+    It knows enough about the future viewset to let the router build urls (lookup, standard and
+    extra actions). Anything else, including dispatching a request, builds the actual serializer
+    and viewset (once) and delegates to them.
+    """
+
+    routing_attributes = ('lookup_field', 'lookup_url_kwarg', 'lookup_value_regex')
+    standard_actions = ('create', 'retrieve', 'update', 'partial_update', 'destroy')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.base_viewset = endpoint.get_base_viewset()
+        self.__name__ = '{}ViewSet'.format(endpoint.model.__name__)
+        self.__module__ = self.base_viewset.__module__
+        self._lock = Lock()
+        self._extra_actions = None
+
+    def materialize(self):
+        if self.endpoint.viewset is None:
+            with self._lock:
+                return self.endpoint.get_viewset()
+        return self.endpoint.viewset
+
+    def _get_extra_actions(self):
+        if self._extra_actions is None:
+            actions = {}
+            if hasattr(self.base_viewset, 'get_extra_actions'):
+                for action in self.base_viewset.get_extra_actions():
+                    actions[action.__name__] = action
+            actions.update(get_factory_actions(self.endpoint))
+            actions.update(get_endpoint_actions(self.endpoint))
+            self._extra_actions = actions
+        return self._extra_actions
+
+    def get_extra_actions(self):
+        if self.endpoint.viewset is not None:
+            return self.endpoint.viewset.get_extra_actions()
+        return [action for name, action in sorted(self._get_extra_actions().items())
+                if is_extra_action(action)]
+
+    def as_view(self, actions=None, **initkwargs):
+        return LazyView(self, actions, initkwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or self.endpoint.viewset is not None:
+            return getattr(self.materialize(), name)
+        if name in self.routing_attributes or name in self.standard_actions:
+            return getattr(self.base_viewset, name)
+        if name == 'list':
+            # always added by viewset_factory
+            return True
+        if name in self._get_extra_actions():
+            return self._get_extra_actions()[name]
+        return getattr(self.materialize(), name)
+
+
+def get_router_viewset(endpoint):
+    """
+    The viewset to register on the router for `endpoint`.
+    """
+    if settings.LAZY_ENDPOINTS and endpoint.viewset is None:
+        return LazyViewSet(endpoint)
+    return endpoint.get_viewset()
 
 
 class EndpointRouter(DefaultRouter):
 
     base_endpoint_class = Endpoint
+    if hasattr(DefaultRouter, 'APIRootView'):
+        APIRootView = type('APIRootView', (ConditionalMetadataMixin, DefaultRouter.APIRootView), {})
 
     def __init__(self, *args, **kwargs):
         self._endpoints = OrderedDict()
         self._registry = {}
+        self._indexes = None
         super(EndpointRouter, self).__init__(*args, **kwargs)
 
+    def freeze(self):
+        """
+        Build the lookup tables used by `get_viewset_for_prefix`, `get_viewset_for_basename`,
+        `get_endpoint_for_model`, `get_endpoints_for_application` and `get_root_metadata`.
+        Called once all endpoints have been discovered, registering or overriding an endpoint
+        afterwards drops the tables which are then rebuilt on next lookup.
+        """
+        positions = {}
+        viewsets_by_prefix = {}
+        viewsets_by_basename = {}
+        for position, (prefix, viewset, base_name) in enumerate(self.registry):
+            positions.setdefault(prefix, []).append(position)
+            viewsets_by_prefix.setdefault(prefix, viewset)
+            viewsets_by_basename.setdefault(base_name, viewset)
+
+        endpoints_by_model = {}
+        endpoints_by_application = defaultdict(list)
+        applications = OrderedDict()
+        for url, endpoint in self._endpoints.items():
+            endpoints_by_model.setdefault(endpoint.model, endpoint)
+            endpoints_by_application[endpoint.application_name].append(endpoint)
+            if endpoint.list_me:
+                applications.setdefault(endpoint.application_name, []).append({
+                    'name': endpoint.model_name,
+                    'singular': endpoint.singular_model_name,
+                    'endpoint': url
+                })
+
+        self._indexes = {
+            'positions': MappingProxyType({prefix: tuple(items) for prefix, items in positions.items()}),
+            'viewsets_by_prefix': MappingProxyType(viewsets_by_prefix),
+            'viewsets_by_basename': MappingProxyType(viewsets_by_basename),
+            'endpoints_by_model': MappingProxyType(endpoints_by_model),
+            'endpoints_by_application': MappingProxyType({
+                app: tuple(endpoints) for app, endpoints in endpoints_by_application.items()
+            }),
+            'root_metadata': {
+                'endpoints': list(self._endpoints.keys()),
+                'applications': [
+                    {
+                        'name': k,
+                        'models': v
+                    } for k, v in applications.items()
+                ],
+            },
+        }
+
+    def _get_index(self, name):
+        if self._indexes is None:
+            self.freeze()
+        return self._indexes[name]
+
+    def get_viewset_for_prefix(self, prefix):
+        return self._get_index('viewsets_by_prefix').get(prefix, None)
+
+    def get_viewset_for_basename(self, base_name):
+        return self._get_index('viewsets_by_basename').get(base_name, None)
+
+    def get_endpoint_for_model(self, model):
+        return self._get_index('endpoints_by_model').get(model, None)
+
+    def get_endpoints_for_application(self, application_name):
+        return self._get_index('endpoints_by_application').get(application_name, ())
+
+    def get_root_metadata(self):
+        return deepcopy(self._get_index('root_metadata'))
+
     def register(self, model=None, endpoint=None, fields=None, permission_classes=None,
                  serializer=None, filter_fields=None, read_only=False, viewset=None,
                  search_fields=None, ordering_fields=None, page_size=None, base_viewset=None,
@@ -60,28 +235,27 @@ class EndpointRouter(DefaultRouter):
 
         super(EndpointRouter, self).register(
             url,
-            endpoint.get_viewset(),
+            get_router_viewset(endpoint),
             base_name=prefix + base_name,
             **kwargs
         )
+        self._indexes = None
 
     def override_registry_entry(self, endpoint):
         url = endpoint.get_url()
         self._endpoints[url] = endpoint
 
-        new_registry = []
-        for (prefix, viewset, base_name) in self.registry:
-            if prefix == url:
-                new_registry.append((url, endpoint.get_viewset(), base_name))
-            else:
-                new_registry.append((prefix, viewset, base_name))
-        self.registry = new_registry
+        for position in self._get_index('positions').get(url, ()):
+            base_name = self.registry[position][2]
+            self.registry[position] = (url, get_router_viewset(endpoint), base_name)
+        self._indexes = None
 
     def get_endpoint(self, url):
         return self._endpoints[url]
 
     def registerViewSet(self, *args, **kwargs):
         super(EndpointRouter, self).register(*args, **kwargs)
+        self._indexes = None
 
 
 def register(wrapped=None, **kwargs):
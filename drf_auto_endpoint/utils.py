@@ -1,3 +1,5 @@
+from collections import Iterable
+
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import FieldDoesNotExist
@@ -11,6 +13,7 @@ from rest_framework import serializers, relations
 from rest_framework.fields import empty
 
 from .app_settings import settings
+from .cache import choices_cache
 
 inflector_language = import_string(settings.INFLECTOR_LANGUAGE)
 inflector = Inflector(inflector_language)
@@ -48,15 +51,81 @@ def get_validation_attrs(instance_field):
     return rv
 
 
+def get_choices_source(field_instance, model_field, related_model):
+    """
+    Return the queryset and the key attribute used to list the choices of a relational field.
+    """
+    qs = related_model.objects
+    if hasattr(field_instance, 'queryset') and field_instance.queryset is not None:
+        qs = field_instance.queryset
+
+    key_attr = 'pk'
+    if model_field and hasattr(model_field, 'to_fields') and model_field.to_fields is not None \
+            and len(model_field.to_fields) > 0:
+        key_attr = model_field.to_fields[0]
+
+    return qs.all(), key_attr
+
+
+def applies_to_field(option, name):
+    """
+    Evaluate an endpoint option which can either be a boolean or an iterable of field names.
+    """
+    if isinstance(option, Iterable):
+        return name in option
+    return bool(option)
+
+
 def get_field_dict(field, serializer, translated_fields=None, fields_annotation=False, model=None,
-                   foreign_key_as_list=False):
+                   foreign_key_as_list=False, lazy_choices=False, choices_url=None):
+    return get_field_dicts([field], serializer, translated_fields, fields_annotation, model,
+                           foreign_key_as_list=bool(foreign_key_as_list), lazy_choices=lazy_choices,
+                           choices_url=choices_url)[0]
+
+
+def get_field_dicts(fields, serializer, translated_fields=None, fields_annotation=False, model=None,
+                    foreign_key_as_list=False, lazy_choices=False, choices_url=None):
+    """
+    Build the field dicts for all of `fields` in one go.
+    `serializer` (either a class or an instance) is only instantiated once and each model field
+    is only resolved once. `foreign_key_as_list` and `lazy_choices` can be booleans or iterables
+    of field names. When a field uses lazy choices, `choices_url(field_name)` gives the url of the
+    endpoint serving them instead of inlining them.
+    """
     if translated_fields is None:
         translated_fields = []
 
-    serializer_instance = serializer()
-    name = field['name'] if isinstance(field, dict) else field
+    if isinstance(serializer, type):
+        serializer_instance = serializer()
+    else:
+        serializer_instance = serializer
+    serializer_fields = serializer_instance.fields
+
+    model_fields = {}
+
+    def get_model_field(name):
+        if name not in model_fields:
+            try:
+                model_fields[name] = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                model_fields[name] = None
+        return model_fields[name]
+
+    rv = []
+    for field in fields:
+        name = field['name'] if isinstance(field, dict) else field
+        rv.append(_build_field_dict(field, name, serializer_instance, serializer_fields, translated_fields,
+                                    fields_annotation, model, get_model_field,
+                                    applies_to_field(foreign_key_as_list, name),
+                                    applies_to_field(lazy_choices, name), choices_url))
+    return rv
+
+
+def _build_field_dict(field, name, serializer_instance, serializer_fields, translated_fields,
+                      fields_annotation, model, get_model_field, foreign_key_as_list, lazy_choices,
+                      choices_url):
     try:
-        field_instance = serializer_instance.fields[name]
+        field_instance = serializer_fields[name]
     except KeyError:
         return {'key': name}
     read_only = name == '__str__'
@@ -99,11 +168,7 @@ def get_field_dict(field, serializer, translated_fields=None, fields_annotation=
     default = field_instance.default if hasattr(field_instance, 'help_text') else empty
     model_field = None
     if model:
-        try:
-            #model_field = model._meta.get_field(field_instance.source)
-            model_field = model._meta.get_field(field_instance.source) if hasattr(field_instance, 'source') else model._meta.get_field(name)
-        except FieldDoesNotExist:
-            pass
+        model_field = get_model_field(field_instance.source if hasattr(field_instance, 'source') else name)
 
     if model_field is not None:
         try:
@@ -140,23 +205,28 @@ def get_field_dict(field, serializer, translated_fields=None, fields_annotation=
                     'plural': inflector.pluralize(related_model._meta.model_name.lower())
                 }
 
+            elif lazy_choices:
+                rv['type'] = settings.WIDGET_MAPPING['choice']
+                rv['choices_endpoint'] = {
+                    'url': choices_url(name) if choices_url is not None else None,
+                    'search_param': 'q',
+                    'limit_param': 'limit',
+                    'offset_param': 'offset',
+                }
+
             else:
                 rv['type'] = settings.WIDGET_MAPPING['choice']
-                qs = related_model.objects
-                if hasattr(field_instance, 'queryset') and field_instance.queryset is not None:
-                    qs = field_instance.queryset
-
-                key_attr = 'pk'
-                if model_field and hasattr(model_field, 'to_fields') and model_field.to_fields is not None \
-                        and len(model_field.to_fields) > 0:
-                    key_attr = model_field.to_fields[0]
-
-                rv['choices'] = [
-                    {
-                        'label': record.__str__(),
-                        'value': getattr(record, key_attr)
-                    } for record in qs.all()
-                ]
+                qs, key_attr = get_choices_source(field_instance, model_field, related_model)
+
+                if settings.CHOICES_CACHE:
+                    rv['choices'] = choices_cache.get(qs, key_attr)
+                else:
+                    rv['choices'] = [
+                        {
+                            'label': record.__str__(),
+                            'value': getattr(record, key_attr)
+                        } for record in qs
+                    ]
 
     elif hasattr(field_instance, 'choices'):
         rv['type'] = settings.WIDGET_MAPPING['choice']
@@ -193,6 +263,24 @@ def action_kwargs(icon_class, btn_class, text, func, kwargs):
     return kwargs
 
 
+def is_extra_action(action):
+    """
+    Whether `action` is routed as an extra action, detected the way DRF does (`bind_to_methods`
+    before DRF 3.9, `mapping` after).
+    """
+    return hasattr(action, 'bind_to_methods') or hasattr(action, 'mapping')
+
+
+def get_action_methods(action):
+    """
+    HTTP methods an extra action is bound to, whatever the version of DRF which decorated it.
+    """
+    if hasattr(action, 'bind_to_methods'):
+        # DRF < 3.9 and actions decorated without DRF's `action`
+        return list(action.bind_to_methods)
+    return list(action.mapping)
+
+
 def get_languages():
     if django_settings.USE_I18N:
         return [
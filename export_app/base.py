@@ -35,12 +35,15 @@ class BaseSerializerExporter(object):
         if endpoint is not None:
             model_name = endpoint.singular_model_name
             application_name = endpoint.application_name
-            viewset = endpoint.viewset
+            viewset = endpoint.get_viewset()
         else:
-            for item in self.router.registry:
-                if item[0] == basename:
-                    viewset = item[1]
-                    break
+            if hasattr(self.router, 'get_viewset_for_prefix'):
+                viewset = self.router.get_viewset_for_prefix(basename)
+            else:
+                for item in self.router.registry:
+                    if item[0] == basename:
+                        viewset = item[1]
+                        break
             if viewset is None:
                 raise ModelNotFoundException(basename)
 
@@ -41,3 +41,31 @@ class HowItWorks(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Ingredient(models.Model):
+
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
+
+
+class Recipe(models.Model):
+
+    name = models.CharField(max_length=255)
+    ingredients = models.ManyToManyField(Ingredient, through='RecipeIngredient')
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} {}'.format(self.quantity, self.ingredient_id)
@@ -3,6 +3,7 @@ from six import iteritems
 from drf_auto_endpoint.utils import reverse
 
 from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
 
 from .factories import get_admin
 
@@ -203,3 +204,23 @@ class EndpointAPITestCase(BaseAPITestCase):
         self.api_is_read_only = self.endpoint.read_only
 
         super(EndpointAPITestCase, self).__init__(*args, **kwargs)
+
+
+class EndpointViewTestMixin(object):
+    """
+    Call the viewset generated for an endpoint directly, without routing the request, as `self.admin`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super(EndpointViewTestMixin, cls).setUpTestData()
+        cls.admin = get_admin()
+
+    def call_view(self, endpoint, action, url, data=None, headers=None, status_code=None, **kwargs):
+        view = endpoint.get_viewset().as_view({'get': action})
+        request = APIRequestFactory().get(url, data, **(headers or {}))
+        force_authenticate(request, self.admin)
+        response = view(request, **kwargs)
+        if status_code is not None:
+            self.assertEqual(response.status_code, status_code)
+        return response
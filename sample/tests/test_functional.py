@@ -1,13 +1,36 @@
-from django.test import override_settings, TestCase
+import json
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from threading import Event, Thread
+from unittest import mock
+
+import serpy
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+from django.test import override_settings, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.management import call_command
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+from rest_framework.viewsets import ModelViewSet
+
+from drf_auto_endpoint.cache import single_flight
+from drf_auto_endpoint.endpoints import Endpoint
+from drf_auto_endpoint.router import EndpointRouter
+from drf_auto_endpoint.instrumentation import QueryBudgetExceeded
+from drf_auto_endpoint.pagination import KeysetPagination
 
 from .factories import CategoryFactory, ProductFactory, HowItWorksFactory
-from .base import EndpointAPITestCase
+from .base import EndpointAPITestCase, EndpointViewTestMixin
 
-from ..models import HowItWorks
+from ..models import Category, HowItWorks, Ingredient, Product, Recipe, RecipeIngredient
 
 from urls import router
 
@@ -45,6 +68,21 @@ class ItRendersAPITest(APITestCase):
         self._do_test()
 
 
+class ConditionalOptionsTest(APITestCase):
+
+    def test_options_etag(self):
+        for url in ('/api/', '/api/sample/categories/'):
+            response = self.client.options(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', response)
+
+            response = self.client.options(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            response = self.client.options(url, HTTP_IF_NONE_MATCH='"outdated"')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
 class ItExportsTest(TestCase):
 
     def _do_test(self):
@@ -178,3 +216,595 @@ class PaginationTestCase(APITestCase):
         page_size = 250
         response = self.client.get('{}?page_size={}'.format(self.url, page_size), format='json')
         self.assertEqual(len(self.get_response_data(response)['results']), page_size)
+
+
+class LazyChoicesTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(LazyChoicesTestCase, cls).setUpTestData()
+        cls.categories = [CategoryFactory(name=name) for name in ('apple', 'banana', 'cherry')]
+
+    def test_lazy_choices(self):
+
+        class LazyProductEndpoint(Endpoint):
+            model = Product
+            foreign_key_as_list = True
+            lazy_choices = ('category', )
+            choices_label_fields = {'category': 'name'}
+
+            def get_choices_url(self, field):
+                return '/choices/{}/'.format(field)
+
+        endpoint = LazyProductEndpoint()
+        field_dict = endpoint._get_field_dict('category')
+        self.assertNotIn('choices', field_dict)
+        self.assertEqual(field_dict['choices_endpoint']['url'], '/choices/category/')
+
+        response = self.call_view(endpoint, 'choices', '/choices/category/', {'limit': 2},
+                                  status_code=status.HTTP_200_OK, field='category')
+        self.assertEqual([choice['label'] for choice in response.data['results']], ['apple', 'banana'])
+        self.assertTrue(response.data['more'])
+
+        response = self.call_view(endpoint, 'choices', '/choices/category/', {'q': 'ban'}, field='category')
+        self.assertEqual(response.data['results'], [{'label': 'banana', 'value': self.categories[1].pk}])
+        self.assertFalse(response.data['more'])
+
+        response = self.call_view(endpoint, 'choices', '/choices/name/', field='name')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_choices_route(self):
+
+        class LazyProductEndpoint(Endpoint):
+            model = Product
+            lazy_choices = ('category', )
+            choices_label_fields = {'category': 'name'}
+
+        endpoint = LazyProductEndpoint()
+        choices_router = EndpointRouter()
+        choices_router.register(endpoint=endpoint)
+
+        class urlconf:
+            urlpatterns = choices_router.urls
+
+        self.client.force_authenticate(self.admin)
+        with override_settings(ROOT_URLCONF=urlconf):
+            url = endpoint.get_choices_url('category')
+            self.assertEqual(url, '/{}/choices/category/'.format(endpoint.get_url()))
+            response = self.client.get(url, {'q': 'ban'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['results'], [{'label': 'banana', 'value': self.categories[1].pk}])
+
+            response = self.client.options('/{}/'.format(endpoint.get_url()))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class FastReadTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(FastReadTestCase, cls).setUpTestData()
+        cls.category = CategoryFactory(name='fruits')
+        cls.products = [ProductFactory(name=name, category=cls.category)
+                        for name in ('apple', 'banana', 'cherry')]
+
+    def test_fast_read(self):
+
+        class FastProductEndpoint(Endpoint):
+            model = Product
+            base_serializer = serpy.Serializer
+            read_only = True
+            fast_read = True
+            fields = ('id', 'name', 'category', 'product_type')
+
+        response = self.call_view(FastProductEndpoint(), 'list', '/fast/', status_code=status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {
+            'id': self.products[0].pk,
+            'name': 'apple',
+            'category': 'fruits',
+            'product_type': 's',
+        })
+
+    def test_computed_fields_are_rejected(self):
+
+        class FastProductEndpoint(Endpoint):
+            model = Product
+            base_serializer = serpy.Serializer
+            read_only = True
+            fast_read = True
+
+        with self.assertRaises(ImproperlyConfigured):
+            FastProductEndpoint().get_viewset()
+
+
+class ColumnarRendererTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [CategoryFactory(name=name) for name in ('apple', 'banana')]
+        cls.url = '/api/sample/categories/'
+
+    def test_row_major(self):
+        response = self.client.get(self.url, {'format': 'columnar'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['count'], 2)
+        columns = data['results']['columns']
+        self.assertIn('name', columns)
+        self.assertEqual(
+            [dict(zip(columns, row))['name'] for row in data['results']['rows']],
+            ['apple', 'banana']
+        )
+
+    def test_column_major(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/vnd.columnar+json; orient=columns')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content.decode('utf-8'))
+        columns = data['results']['columns']
+        self.assertEqual(data['results']['values'][columns.index('name')], ['apple', 'banana'])
+
+
+class StreamingListTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(StreamingListTestCase, cls).setUpTestData()
+        cls.categories = [CategoryFactory(name='category {}'.format(i)) for i in range(5)]
+        ProductFactory(category=cls.categories[0])
+
+    def test_stream_list(self):
+
+        class StreamingCategoryEndpoint(Endpoint):
+            model = Category
+            stream_list = True
+            stream_chunk_size = 2
+
+        endpoint = StreamingCategoryEndpoint()
+        response = self.call_view(endpoint, 'list', '/stream/', {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual([item['name'] for item in data], [category.name for category in self.categories])
+        self.assertEqual(len(data[0]['products']), 1)
+
+        # without ?stream, paginated endpoints keep their regular response
+        response = self.call_view(endpoint, 'list', '/stream/')
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.data['count'], 5)
+
+
+class CSVExportTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(CSVExportTestCase, cls).setUpTestData()
+        cls.categories = [CategoryFactory(name=name) for name in ('apple', 'banana', 'cherry')]
+        cls.url = '/api/sample/categories/'
+
+    def get_csv(self, query):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8').splitlines()
+
+    def test_csv_export(self):
+        lines = self.get_csv({'format': 'csv', 'fields': 'name,id'})
+        self.assertEqual(lines, ['name,id'] + ['{},{}'.format(category.name, category.pk)
+                                               for category in self.categories])
+
+    def test_csv_filters(self):
+        endpoint = Endpoint(model=Category, search_fields=('name', ))
+        response = self.call_view(endpoint, 'list', '/export/',
+                                  {'format': 'csv', 'fields': 'name', 'search': 'an'})
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8').splitlines(),
+                         ['name', 'banana'])
+
+    def test_csv_unknown_field(self):
+        response = self.client.get(self.url, {'format': 'csv', 'fields': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CountStrategyTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(CountStrategyTestCase, cls).setUpTestData()
+        cls.categories = [CategoryFactory(name='category {}'.format(i)) for i in range(5)]
+
+    def get_list(self, endpoint, query='', status_code=status.HTTP_200_OK):
+        return self.call_view(endpoint, 'list', '/categories/' + query, status_code=status_code).data
+
+    def test_capped_count(self):
+
+        class CappedCategoryEndpoint(Endpoint):
+            model = Category
+            page_size = 2
+            count_strategy = 'capped'
+            count_cap = 3
+
+        endpoint = CappedCategoryEndpoint()
+        data = self.get_list(endpoint)
+        self.assertEqual(data['count'], '3+')
+        self.assertIsNotNone(data['next'])
+
+        data = self.get_list(endpoint, '?page=3')
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next'])
+
+    def test_no_count(self):
+
+        class UncountedCategoryEndpoint(Endpoint):
+            model = Category
+            base_pagination_class = LimitOffsetPagination
+            default_limit = 4
+            count_strategy = 'none'
+
+        endpoint = UncountedCategoryEndpoint()
+        with self.assertNumQueries(1):
+            data = endpoint.get_viewset().pagination_class().paginate_queryset(
+                Category.objects.all(), Request(APIRequestFactory().get('/categories/')))
+        self.assertEqual(len(data), 4)
+
+        data = self.get_list(endpoint)
+        self.assertNotIn('count', data)
+        self.assertEqual(len(data['results']), 4)
+        self.assertIsNotNone(data['next'])
+        self.assertIsNone(self.get_list(endpoint, '?offset=4')['next'])
+
+    def test_estimated_count(self):
+
+        class EstimatedCategoryEndpoint(Endpoint):
+            model = Category
+            page_size = 2
+            count_strategy = 'estimated'
+
+        data = self.get_list(EstimatedCategoryEndpoint())
+        if connection.vendor == 'postgresql':
+            self.assertIsInstance(data['count'], int)
+        else:
+            # falls back to an exact count on databases without estimates
+            self.assertEqual(data['count'], 5)
+
+    def test_last_page(self):
+        for count_strategy in ('exact', 'capped', 'estimated', 'none'):
+
+            class PagedCategoryEndpoint(Endpoint):
+                model = Category
+                page_size = 2
+                count_cap = 3
+
+            PagedCategoryEndpoint.count_strategy = count_strategy
+            endpoint = PagedCategoryEndpoint()
+            if count_strategy == 'exact':
+                data = self.get_list(endpoint, '?page=last')
+                self.assertEqual(len(data['results']), 1)
+                self.assertIsNone(data['next'])
+            else:
+                # the count isn't exact, the last page can't be located
+                self.get_list(endpoint, '?page=last', status.HTTP_404_NOT_FOUND)
+
+
+class KeysetPaginationTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(KeysetPaginationTestCase, cls).setUpTestData()
+        cls.categories = [CategoryFactory(name=name) for name in ('a', 'b', 'a', 'c', 'b', 'd', 'c')]
+
+    def get_page(self, url):
+        return self.call_view(self.endpoint, 'list', url, status_code=status.HTTP_200_OK).data
+
+    def setUp(self):
+
+        class KeysetCategoryEndpoint(Endpoint):
+            model = Category
+            base_pagination_class = KeysetPagination
+            page_size = 3
+            ordering_fields = ('name', )
+
+        self.endpoint = KeysetCategoryEndpoint()
+
+    def test_keyset_pagination(self):
+        pages = []
+        url = '/categories/?ordering=-name'
+        while url is not None:
+            data = self.get_page(url)
+            pages.append(data)
+            url = data['next']
+
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        expected = sorted(self.categories, key=lambda category: (category.name, -category.pk), reverse=True)
+        self.assertEqual([item['id'] for page in pages for item in page['results']],
+                         [category.pk for category in expected])
+
+        previous = self.get_page(pages[2]['previous'])
+        self.assertEqual(previous['results'], pages[1]['results'])
+        self.assertIsNone(pages[0]['previous'])
+
+    def paginate(self, queryset, page_size=2):
+        paginator = KeysetPagination()
+        paginator.page_size = page_size
+        rv = []
+        url = '/categories/'
+        for __ in range(queryset.count() + 1):
+            page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(url)))
+            rv += [obj.pk for obj in page]
+            url = paginator.get_next_link()
+            if url is None:
+                break
+        return rv
+
+    def test_microsecond_ordering(self):
+        recipe = Recipe.objects.create(name='salad')
+        ingredient = Ingredient.objects.create(name='tomato')
+        rows = [RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient) for __ in range(5)]
+        # all in the same millisecond
+        start = timezone.now().replace(microsecond=0)
+        for index, row in enumerate(rows):
+            RecipeIngredient.objects.filter(pk=row.pk).update(
+                updated_at=start + timedelta(microseconds=100 * (5 - index)))
+
+        pks = [row.pk for row in rows]
+        self.assertEqual(self.paginate(RecipeIngredient.objects.order_by('updated_at')), pks[::-1])
+        self.assertEqual(self.paginate(RecipeIngredient.objects.order_by('-updated_at')), pks)
+
+    def test_nullable_ordering(self):
+        queryset = Category.objects.annotate(rank=Case(
+            When(name__in=('a', 'c'), then=Value(None)),
+            default=F('name'),
+            output_field=CharField(),
+        ))
+        nulls = sorted(category.pk for category in self.categories if category.name in ('a', 'c'))
+        others = [category for category in self.categories if category.pk not in nulls]
+        ascending = sorted(others, key=lambda category: (category.name, category.pk))
+        descending = sorted(others, key=lambda category: (category.name, -category.pk), reverse=True)
+
+        # NULLs come last in ascending order, first in descending order
+        self.assertEqual(self.paginate(queryset.order_by('rank')),
+                         [category.pk for category in ascending] + nulls)
+        self.assertEqual(self.paginate(queryset.order_by('-rank')),
+                         nulls + [category.pk for category in descending])
+
+    def test_ordering_change(self):
+        data = self.get_page('/categories/?ordering=name')
+        self.call_view(self.endpoint, 'list', data['next'].replace('ordering=name', 'ordering=-name'),
+                       status_code=status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_cursor_values(self):
+        for values in (['a', 'abc'], ['a', [1]], 5, ['a']):
+            cursor = json.dumps({'d': 'next', 'o': ['name', 'pk'], 'v': values})
+            response = self.call_view(self.endpoint, 'list', '/categories/', {
+                'ordering': 'name',
+                'cursor': urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii'),
+            })
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
+
+
+class ResponseCacheTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(ResponseCacheTestCase, cls).setUpTestData()
+        cls.category = CategoryFactory(name='fruits')
+
+    def setUp(self):
+
+        class CachedCategoryEndpoint(Endpoint):
+            model = Category
+            response_cache = True
+
+        self.endpoint = CachedCategoryEndpoint()
+
+    def get(self, action, url, **kwargs):
+        response = self.call_view(self.endpoint, action, url, status_code=status.HTTP_200_OK, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_list_cache(self):
+        data = self.get('list', '/categories/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('list', '/categories/'), data)
+        self.assertEqual(data['results'][0]['products'], [])
+
+        # related models rendered by the endpoint invalidate its responses as well
+        product = ProductFactory(category=self.category)
+        data = self.get('list', '/categories/')
+        self.assertEqual(data['results'][0]['products'], [product.pk])
+
+        # a different query isn't served from the cache
+        self.assertEqual(self.get('list', '/categories/?page_size=1')['count'], 1)
+
+    def test_html_is_not_cached(self):
+        for __ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.call_view(self.endpoint, 'list', '/categories/',
+                                          headers={'HTTP_ACCEPT': 'text/html'})
+                response.render()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertGreater(len(queries), 0)
+
+    def test_retrieve_cache(self):
+        data = self.get('retrieve', '/categories/', pk=self.category.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('retrieve', '/categories/', pk=self.category.pk), data)
+
+        self.category.name = 'vegetables'
+        self.category.save()
+        self.assertEqual(self.get('retrieve', '/categories/', pk=self.category.pk)['name'], 'vegetables')
+
+
+class CoalescedListTestCase(TransactionTestCase):
+
+    def test_coalesced_list(self):
+        CategoryFactory(name='fruits')
+        leader_started, follower_waiting = Event(), Event()
+        querysets = []
+
+        class BlockingViewSet(ModelViewSet):
+
+            def get_queryset(self):
+                querysets.append(1)
+                leader_started.set()
+                # stay in flight until the other request waits for us
+                follower_waiting.wait(5)
+                return super(BlockingViewSet, self).get_queryset()
+
+        class CoalescedCategoryEndpoint(Endpoint):
+            model = Category
+            base_viewset = BlockingViewSet
+            permission_classes = (AllowAny, )
+            coalesce_list = True
+
+        view = CoalescedCategoryEndpoint().get_viewset().as_view({'get': 'list'})
+        responses = []
+
+        def get():
+            try:
+                responses.append(view(APIRequestFactory().get('/categories/')))
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(single_flight, 'waiting', lambda key: follower_waiting.set()):
+            leader = Thread(target=get)
+            leader.start()
+            leader_started.wait(5)
+            follower = Thread(target=get)
+            follower.start()
+            leader.join()
+            follower.join()
+
+        self.assertEqual(len(querysets), 1)
+        self.assertEqual(len(responses), 2)
+        self.assertIsNot(responses[0], responses[1])
+        for response in responses:
+            response.render()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content.decode('utf-8'))['results'][0]['name'], 'fruits')
+
+
+class ConditionalGetTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(ConditionalGetTestCase, cls).setUpTestData()
+        cls.recipe = Recipe.objects.create(name='salad')
+        cls.ingredient = Ingredient.objects.create(name='tomato')
+        cls.row = RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.ingredient)
+
+    def setUp(self):
+
+        class RecipeIngredientEndpoint(Endpoint):
+            model = RecipeIngredient
+            conditional_get = True
+
+        self.endpoint = RecipeIngredientEndpoint()
+
+    def get(self, action, url, etag=None, **kwargs):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag is not None else {}
+        response = self.call_view(self.endpoint, action, url, headers=headers, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_retrieve(self):
+        response = self.get('retrieve', '/recipe-ingredients/', pk=self.row.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        response = self.get('retrieve', '/recipe-ingredients/', etag, pk=self.row.pk)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # don't alter the instance shared by the tests
+        row = RecipeIngredient.objects.get(pk=self.row.pk)
+        row.quantity = 2
+        row.save()
+        response = self.get('retrieve', '/recipe-ingredients/', etag, pk=self.row.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list(self):
+        response = self.get('list', '/recipe-ingredients/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.get('list', '/recipe-ingredients/', etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # other filters get another validator
+        response = self.get('list', '/recipe-ingredients/?page_size=1', etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        RecipeIngredient.objects.get(pk=self.row.pk).delete()
+        response = self.get('list', '/recipe-ingredients/', etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_without_updated_at(self):
+        self.assertFalse(Endpoint(model=Category).has_conditional_get())
+
+        class ConditionalCategoryEndpoint(Endpoint):
+            model = Category
+            conditional_get = True
+
+        self.assertFalse(ConditionalCategoryEndpoint().has_conditional_get())
+
+    def test_opt_in(self):
+        self.assertFalse(Endpoint(model=RecipeIngredient).has_conditional_get())
+
+
+reports = []
+
+
+def collect_report(view, request, response, report):
+    reports.append(report)
+
+
+class InstrumentationTestCase(EndpointViewTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super(InstrumentationTestCase, cls).setUpTestData()
+        category = CategoryFactory(name='fruits')
+        ProductFactory(category=category)
+
+    def get(self, endpoint):
+        return self.call_view(endpoint, 'list', '/categories/')
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.get(Endpoint(model=Category))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_rendered)
+        phases = [timing.split(';')[0] for timing in response['Server-Timing'].split(', ')]
+        for name in ('get_queryset', 'filter_queryset', 'paginate', 'serialize', 'render', 'total'):
+            self.assertIn(name, phases)
+        # at least the count, the page and the products
+        self.assertGreaterEqual(int(response['X-Query-Count']), 3)
+
+    @override_settings(DRF_AUTO_INSTRUMENTATION_SINK='sample.tests.test_functional.collect_report')
+    def test_sink(self):
+        del reports[:]
+        response = self.get(Endpoint(model=Category))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0]['total']['queries'],
+                         sum(stats['queries'] for name, stats in reports[0].items() if name != 'total'))
+        self.assertEqual(reports[0]['paginate']['queries'], 3)
+
+    def test_query_budget(self):
+
+        class BudgetCategoryEndpoint(Endpoint):
+            model = Category
+            query_budget = 3
+            query_budget_action = 'raise'
+
+        self.assertEqual(self.get(BudgetCategoryEndpoint()).status_code, status.HTTP_200_OK)
+
+        # without the prefetch, products are fetched once per category
+        CategoryFactory(name='vegetables')
+        BudgetCategoryEndpoint.prefetch_related = []
+        with self.assertRaises(QueryBudgetExceeded):
+            self.get(BudgetCategoryEndpoint())
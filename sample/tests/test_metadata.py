@@ -1,8 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from drf_auto_endpoint.metadata import AutoMetadataMixin
+from drf_auto_endpoint.metadata import AutoMetadataMixin, invalidate_metadata_cache
 
 from sample.endpoints import ProductEndpoint
+from sample.models import Category
 
 from .data import DummyProductSerializer, DummyProductViewSet, DummyProductSerializerWithAllFields
 
@@ -76,3 +77,46 @@ class TestMetadata(TestCase):
         view = MockView()
         metadata = metadata_mixin.determine_metadata(request, view)
         self.assertEqual(['id', 'name', 'product_type', 'category'], [item['key'] for item in metadata])
+
+    @override_settings(DRF_AUTO_METADATA_CACHE=True)
+    def test_metadata_cache(self):
+        metadata_mixin = AutoMetadataMixin()
+        request = None
+
+        class MockView(object):
+            serializer_class = DummyProductSerializer
+            endpoint = ProductEndpoint(fields=['name'])
+
+            def get_serializer_class(self):
+                return self.serializer_class
+
+        view = MockView()
+        metadata = metadata_mixin.determine_metadata(request, view)
+        self.assertIs(metadata, metadata_mixin.determine_metadata(request, view))
+
+        invalidate_metadata_cache(view.endpoint)
+        new_metadata = metadata_mixin.determine_metadata(request, view)
+        self.assertIsNot(metadata, new_metadata)
+        self.assertEqual(metadata, new_metadata)
+
+    @override_settings(DRF_AUTO_METADATA_CACHE=True, DRF_AUTO_CHOICES_CACHE=False)
+    def test_metadata_cache_inlined_choices(self):
+        metadata_mixin = AutoMetadataMixin()
+        request = None
+
+        class MockView(object):
+            serializer_class = DummyProductSerializer
+            endpoint = ProductEndpoint(fields=['name', 'category'])
+
+            def get_serializer_class(self):
+                return self.serializer_class
+
+        view = MockView()
+        view.endpoint.foreign_key_as_list = ['category']
+        metadata_mixin.determine_metadata(request, view)
+
+        # without the choices cache, nothing would drop a cached document when categories change
+        Category.objects.create(name='new category')
+        metadata = metadata_mixin.determine_metadata(request, view)
+        category, = [item for item in metadata if item['key'] == 'category']
+        self.assertIn('new category', [choice['label'] for choice in category['choices']])
@@ -1,6 +1,19 @@
-from django.test import TestCase, override_settings
+from datetime import date
+from decimal import Decimal
+from threading import Event, Thread
+from uuid import UUID
+
+import serpy
+
+from django.contrib.sessions.models import Session
+from django.db import connection, models, transaction
+from django.db.models.deletion import Collector
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
 from rest_framework import filters, pagination
 from rest_framework.serializers import CharField, IntegerField
 from rest_framework.viewsets import ModelViewSet
@@ -10,14 +23,18 @@ except ImportError:
     # Older versions of DRF and django_filters
     from rest_framework.filters import DjangoFilterBackend
 
-from ..models import Product, Category, PRODUCT_TYPES
+from ..models import Product, Category, PRODUCT_TYPES, Ingredient, Recipe, RecipeIngredient
 
 from .data import AllFieldDummyProductSerializer, DummyProductSerializer, DummyProductViewSet, DummyProductSerializerWithField
 
+from drf_auto_endpoint.decorators import bulk_action, custom_action
 from drf_auto_endpoint.endpoints import Endpoint
-from drf_auto_endpoint.router import router
+from drf_auto_endpoint.router import router, EndpointRouter, LazyViewSet
 from drf_auto_endpoint import utils
+from drf_auto_endpoint.factories import (ForeignKeyField, IsoFormatField, get_aggregate_cache_key,
+                                         get_serpy_type)
 from drf_auto_endpoint.app_settings import settings
+from drf_auto_endpoint.cache import SingleFlight, model_versions
 
 
 class EndpointTestCase(TestCase):
@@ -207,6 +224,25 @@ class EndpointTestCase(TestCase):
         self.assertTrue(issubclass(dummy.get_base_viewset(), DummyViewSet))
 
 
+class ActionIndexTestCase(TestCase):
+
+    def test_action_index(self):
+        endpoint = router.get_endpoint('sample/howitworks')
+        self.assertEqual(
+            sorted((item['type'], item['name']) for item in endpoint._action_index),
+            [('bulk', 'decrement'), ('custom', 'add'), ('custom', 'increment')]
+        )
+
+        self.assertEqual(
+            sorted(action['url'] for action in endpoint.get_custom_actions()),
+            ['/api/sample/howitworks/:id/add/', '/api/sample/howitworks/:id/increment/']
+        )
+        bulk_actions = endpoint.get_bulk_actions()
+        self.assertEqual([action['url'] for action in bulk_actions], ['/api/sample/howitworks/decrement/'])
+        self.assertEqual(bulk_actions[0]['verb'].upper(), 'POST')
+        self.assertEqual(endpoint.get_list_actions(), [])
+
+
 class RouterTestCase(TestCase):
 
     def test_register_model(self):
@@ -224,6 +260,364 @@ class RouterTestCase(TestCase):
         endpoint = router.get_endpoint('bogus')
         self.assertTrue(isinstance(endpoint, Endpoint))
 
+    def test_freeze(self):
+        local_router = EndpointRouter()
+        endpoint = Endpoint(model=Category)
+        local_router.register(endpoint=endpoint)
+        local_router.freeze()
+        self.assertIs(local_router.get_endpoint('sample/categories'), endpoint)
+        self.assertIs(local_router.get_endpoint_for_model(Category), endpoint)
+        self.assertIs(local_router.get_viewset_for_prefix('sample/categories'), endpoint.get_viewset())
+        self.assertIs(local_router.get_viewset_for_basename('sample/categories'), endpoint.get_viewset())
+        self.assertIn(endpoint, local_router.get_endpoints_for_application('sample'))
+        self.assertIn('sample/categories', local_router.get_root_metadata()['endpoints'])
+
+        local_router.register(Product, url='frozen')
+        self.assertIn('frozen', local_router.get_root_metadata()['endpoints'])
+
+        new_endpoint = Endpoint(model=Category)
+        local_router.override_registry_entry(new_endpoint)
+        self.assertIs(local_router.get_viewset_for_prefix('sample/categories'), new_endpoint.get_viewset())
+
+    @override_settings(DRF_AUTO_LAZY_ENDPOINTS=True)
+    def test_lazy_endpoints(self):
+        lazy_router = EndpointRouter()
+        endpoint = Endpoint(model=Product)
+        self.assertIsNone(endpoint.viewset)
+
+        lazy_router.register(endpoint=endpoint)
+        self.assertIsInstance(lazy_router.registry[0][1], LazyViewSet)
+        url_names = [getattr(url, 'name', None) for url in lazy_router.urls]
+        self.assertIn('sample/products-list', url_names)
+        self.assertIn('sample/products-detail', url_names)
+        self.assertIsNone(endpoint.viewset)
+
+        viewset = lazy_router.registry[0][1].materialize()
+        self.assertIs(viewset, endpoint.viewset)
+        self.assertEqual(viewset.serializer_class.Meta.model, Product)
+
+    def test_lazy_endpoint_actions(self):
+
+        class ActionProductEndpoint(Endpoint):
+            model = Product
+
+            @custom_action(method='POST')
+            def touch(self, request, pk):
+                return Response()
+
+            @bulk_action(method='POST')
+            def touch_all(self, request):
+                return Response()
+
+        eager_router = EndpointRouter()
+        eager_router.register(endpoint=ActionProductEndpoint())
+        with override_settings(DRF_AUTO_LAZY_ENDPOINTS=True):
+            lazy_router = EndpointRouter()
+            endpoint = ActionProductEndpoint()
+            lazy_router.register(endpoint=endpoint)
+            url_names = [getattr(url, 'name', None) for url in lazy_router.urls]
+        self.assertIsNone(endpoint.viewset)
+
+        self.assertIn('sample/products-touch', url_names)
+        self.assertEqual(sorted(url_names), sorted(getattr(url, 'name', None) for url in eager_router.urls))
+
+
+class QueryPlanTestCase(TestCase):
+
+    def test_reverse_relation_is_prefetched(self):
+        endpoint = Endpoint(model=Category)
+        self.assertEqual(endpoint.get_query_plan(), ((), ('products', )))
+
+    def test_primary_key_is_not_joined(self):
+        endpoint = Endpoint(model=Product, serializer=DummyProductSerializer)
+        self.assertEqual(endpoint.get_query_plan(), ((), ()))
+
+    def test_string_related_is_joined(self):
+        class StringProductSerializer(DummyProductSerializer):
+            category = CharField(source='category.name', read_only=True)
+
+        endpoint = Endpoint(model=Product, serializer=StringProductSerializer)
+        self.assertEqual(endpoint.get_query_plan(), (('category', ), ()))
+
+    def test_override(self):
+        endpoint = Endpoint(model=Category, prefetch_related=())
+        self.assertEqual(endpoint.get_query_plan(), ((), ()))
+
+    def test_list_queries(self):
+        category = Category.objects.create(name='c1')
+        for i in range(3):
+            Product.objects.create(name='p{}'.format(i), category=category)
+            Category.objects.create(name='c{}'.format(i + 2))
+        endpoint = Endpoint(model=Category)
+        viewset = endpoint.get_viewset()(request=None, format_kwarg=None, action='list')
+        with self.assertNumQueries(2):
+            data = endpoint.get_serializer()(viewset.get_queryset(), many=True).data
+        self.assertEqual(len(data[0]['products']), 3)
+
+
+class NestedManyToManyTestCase(TestCase):
+
+    def setUp(self):
+        # deleted rows are collected (and signals sent) once versions are tracked
+        model_versions.connect([Recipe, RecipeIngredient])
+        self.serializer = Endpoint(model=Recipe).get_serializer()
+        self.flour = Ingredient.objects.create(name='flour')
+        self.sugar = Ingredient.objects.create(name='sugar')
+
+    def test_descriptors(self):
+        descriptor, = self.serializer._m2m_descriptors
+        self.assertEqual(descriptor['name'], 'ingredients')
+        self.assertIs(descriptor['through'], RecipeIngredient)
+        self.assertEqual(descriptor['fk_name'], 'recipe')
+        self.assertEqual(descriptor['related_name'], 'recipeingredient_set')
+        self.assertTrue(descriptor['timestamped'])
+
+    def test_create_and_update(self):
+        serializer = self.serializer(data={
+            'name': 'cake',
+            'ingredients': [{'ingredient': self.flour.id, 'quantity': 2}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        recipe = serializer.save()
+        through = RecipeIngredient.objects.get(recipe=recipe)
+        self.assertEqual((through.ingredient, through.quantity), (self.flour, 2))
+
+        serializer = self.serializer(recipe, data={
+            'name': 'cake',
+            'ingredients': [
+                {'id': through.id, 'ingredient': self.flour.id, 'quantity': 3},
+                {'ingredient': self.sugar.id, 'quantity': 1},
+            ],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(
+            list(RecipeIngredient.objects.filter(recipe=recipe).order_by('id')
+                 .values_list('ingredient', 'quantity')),
+            [(self.flour.id, 3), (self.sugar.id, 1)]
+        )
+
+        serializer = self.serializer(recipe, data={
+            'name': 'cake',
+            'ingredients': [{'ingredient': self.sugar.id, 'quantity': 1}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(RecipeIngredient.objects.filter(recipe=recipe).count(), 1)
+
+    def check_write_queries(self, size):
+        data = {
+            'name': 'cake',
+            'ingredients': [{'ingredient': self.flour.id, 'quantity': i + 1} for i in range(size)],
+        }
+        serializer = self.serializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # savepoint, recipe, through rows, release
+        with self.assertNumQueries(4):
+            recipe = serializer.save()
+
+        data['ingredients'] = [
+            {'id': pk, 'ingredient': self.sugar.id, 'quantity': 1}
+            for pk in RecipeIngredient.objects.filter(recipe=recipe).values_list('id', flat=True)[1:]
+        ] + [{'ingredient': self.flour.id, 'quantity': 2} for __ in range(size)]
+        serializer = self.serializer(recipe, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # savepoint, rows to delete, delete, bulk update, bulk create, recipe, release
+        with self.assertNumQueries(7):
+            serializer.save()
+        self.assertEqual(RecipeIngredient.objects.filter(recipe=recipe).count(), size * 2 - 1)
+
+    def test_nested_ids_resolved_in_bulk(self):
+        recipe = Recipe.objects.create(name='cake')
+        rows = [RecipeIngredient.objects.create(recipe=recipe, ingredient=self.flour) for __ in range(5)]
+        data = {
+            'name': 'cake',
+            'ingredients': [{'id': row.id, 'ingredient': self.flour.id, 'quantity': 2} for row in rows],
+        }
+        serializer = self.serializer(recipe, data=data)
+        # PrimaryKeyRelatedField still fetches each ingredient, through rows take a single query
+        with self.assertNumQueries(1 + len(rows)):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(
+            [item['instance'] for item in serializer.validated_data['recipeingredient_set']],
+            rows
+        )
+
+        data['ingredients'] += [{'id': 9998, 'ingredient': self.flour.id},
+                                {'id': 9999, 'ingredient': self.flour.id}]
+        serializer = self.serializer(recipe, data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('9998, 9999', str(serializer.errors['ingredients']))
+
+    def test_write_queries(self):
+        # the number of queries doesn't depend on the number of through rows
+        self.check_write_queries(2)
+        self.check_write_queries(20)
+
+    def test_bulk_writes_bump_versions(self):
+        version = model_versions.get(RecipeIngredient)
+        serializer = self.serializer(data={
+            'name': 'cake',
+            'ingredients': [{'ingredient': self.flour.id, 'quantity': 2}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        recipe = serializer.save()
+        self.assertNotEqual(model_versions.get(RecipeIngredient), version)
+
+        version = model_versions.get(RecipeIngredient)
+        through = RecipeIngredient.objects.get(recipe=recipe)
+        serializer = self.serializer(recipe, data={
+            'name': 'cake',
+            'ingredients': [{'id': through.id, 'ingredient': self.flour.id, 'quantity': 3}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertNotEqual(model_versions.get(RecipeIngredient), version)
+
+
+class ModelVersionsTestCase(TransactionTestCase):
+
+    def test_bump_on_commit(self):
+        model_versions.connect([Category])
+        with transaction.atomic():
+            version = model_versions.get(Category)
+            Category.objects.create(name='c1')
+            self.assertNotEqual(model_versions.get(Category), version)
+            # other processes may cache the rows being replaced until the transaction commits
+            version = model_versions.get(Category)
+        self.assertNotEqual(model_versions.get(Category), version)
+
+    def test_connected_models_only(self):
+        model_versions.connect([Category])
+        self.assertTrue(Collector(using='default').can_fast_delete(Session.objects.all()))
+
+
+class SerpyTypeTestCase(TestCase):
+
+    def test_mro_resolution(self):
+        class CustomCharField(models.CharField):
+            pass
+
+        self.assertIsInstance(get_serpy_type(CustomCharField), serpy.StrField)
+        self.assertIsInstance(get_serpy_type(models.DateTimeField), IsoFormatField)
+        self.assertIsInstance(get_serpy_type(models.ForeignKey), ForeignKeyField)
+        self.assertIsNot(get_serpy_type(models.CharField), get_serpy_type(models.CharField))
+
+    def test_typed_output(self):
+        self.assertEqual(get_serpy_type(models.DateField).to_value(date(2018, 4, 27)), '2018-04-27')
+        self.assertEqual(get_serpy_type(models.DecimalField).to_value(Decimal('0.10')), '0.10')
+        self.assertEqual(get_serpy_type(models.DecimalField).to_value(Decimal('1E+2')), '100')
+        self.assertEqual(
+            get_serpy_type(models.UUIDField).to_value(UUID('12345678123456781234567812345678')),
+            '12345678-1234-5678-1234-567812345678'
+        )
+
+    @override_settings(DRF_AUTO_SERPY_TYPE_MAPPING={'django.db.models.CharField': 'serpy.IntField'})
+    def test_setting(self):
+        self.assertIsInstance(get_serpy_type(models.SlugField), serpy.IntField)
+
+
+class AggregateCacheTestCase(TestCase):
+
+    def get_key(self, viewset, query):
+        return get_aggregate_cache_key(viewset, Request(APIRequestFactory().get('/' + query)))
+
+    @override_settings(DRF_AUTO_AGGREGATE_CACHE=True)
+    def test_aggregate_cache_key(self):
+        viewset = Endpoint(model=Category).get_viewset()()
+        key = self.get_key(viewset, '?b=2&a=1&a=0')
+        self.assertEqual(key, self.get_key(viewset, '?a=0&b=2&a=1'))
+        self.assertNotEqual(key, self.get_key(viewset, '?b=2&a=1'))
+
+        category = Category.objects.create(name='new')
+        self.assertNotEqual(key, self.get_key(viewset, '?b=2&a=1&a=0'))
+        key = self.get_key(viewset, '?b=2&a=1&a=0')
+        category.delete()
+        self.assertNotEqual(key, self.get_key(viewset, '?b=2&a=1&a=0'))
+
+    def test_disabled(self):
+        viewset = Endpoint(model=Category).get_viewset()()
+        self.assertIsNone(self.get_key(viewset, '?a=1'))
+
+
+class RowCacheTestCase(TestCase):
+
+    def test_row_cache(self):
+
+        class RowCacheCategoryEndpoint(Endpoint):
+            model = Category
+            row_cache = True
+
+        categories = [Category.objects.create(name='category {}'.format(i)) for i in range(3)]
+        serializer = RowCacheCategoryEndpoint().get_serializer()
+        data = serializer(Category.objects.all(), many=True).data
+        self.assertEqual([item['name'] for item in data], [category.name for category in categories])
+
+        # only the list itself is fetched, products of each category come from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(serializer(Category.objects.all(), many=True).data, data)
+
+        Product.objects.create(name='apple', category=categories[0])
+        data = serializer(Category.objects.all(), many=True).data
+        self.assertEqual(len(data[0]['products']), 1)
+
+
+class SignalingSingleFlight(SingleFlight):
+
+    def __init__(self):
+        super(SignalingSingleFlight, self).__init__()
+        self.follower_waiting = Event()
+
+    def waiting(self, key):
+        self.follower_waiting.set()
+
+
+class SingleFlightTestCase(TestCase):
+
+    def test_concurrent_calls(self):
+        flight = SignalingSingleFlight()
+        started = Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            # stay in flight until the follower waits for us
+            flight.follower_waiting.wait(5)
+            return 'result'
+
+        results = []
+        leader = Thread(target=lambda: results.append(flight.do('key', compute)))
+        leader.start()
+        started.wait(5)
+        follower = Thread(target=lambda: results.append(flight.do('key', compute, timeout=5)))
+        follower.start()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('result', False), ('result', True)])
+
+        # nothing is kept once the call is over
+        self.assertEqual(flight.do('key', compute), ('result', False))
+        self.assertEqual(len(calls), 2)
+
+    def test_timeout(self):
+        flight = SingleFlight()
+        started, release = Event(), Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'slow'
+
+        leader = Thread(target=lambda: flight.do('key', slow))
+        leader.start()
+        started.wait(5)
+        self.assertEqual(flight.do('key', lambda: 'fast', timeout=0.01), ('fast', False))
+        release.set()
+        leader.join()
+
 
 class ViewSetFactoryTestCase(TestCase):
 
@@ -239,6 +633,19 @@ class UtilsTestCase(TestCase):
         utils.reverse('sample/products-list')
         self.assertTrue(True)
 
+    def test_get_action_methods(self):
+
+        def legacy():
+            pass
+        legacy.bind_to_methods = ['POST']
+
+        def current():
+            pass
+        current.mapping = {'get': 'current'}
+
+        self.assertEqual(utils.get_action_methods(legacy), ['POST'])
+        self.assertEqual(utils.get_action_methods(current), ['get'])
+
     def test_validation_attrs(self):
         data = (
             (CharField(), {}),
@@ -305,6 +712,57 @@ class UtilsTestCase(TestCase):
                                  input_args
                              ))
 
+    def test_get_field_dicts(self):
+        endpoint = Endpoint(model=Product)
+        fields = endpoint.get_fields_for_serializer()
+
+        class CountingSerializer(endpoint.get_serializer()):
+            instances = 0
+
+            def __init__(self, *args, **kwargs):
+                CountingSerializer.instances += 1
+                super(CountingSerializer, self).__init__(*args, **kwargs)
+
+        field_dicts = utils.get_field_dicts(fields, CountingSerializer, model=Product)
+        self.assertEqual(CountingSerializer.instances, 1)
+        self.assertEqual(field_dicts, [
+            utils.get_field_dict(field, CountingSerializer, model=Product)
+            for field in fields
+        ])
+
+        field_dicts = utils.get_field_dicts(fields, CountingSerializer, model=Product,
+                                            foreign_key_as_list=['category'])
+        field_dicts = {field_dict['key']: field_dict for field_dict in field_dicts}
+        self.assertIn('choices', field_dicts['category'])
+        self.assertNotIn('choices', field_dicts['name'])
+
+    @override_settings(DRF_AUTO_CHOICES_CACHE=True)
+    def test_choices_cache(self):
+        Category.objects.create(name='first')
+        serializer = Endpoint(model=Product).get_serializer()
+
+        field_dict = utils.get_field_dict('category', serializer, model=Product, foreign_key_as_list=True)
+        self.assertEqual(len(field_dict['choices']), Category.objects.count())
+
+        with self.assertNumQueries(0):
+            cached = utils.get_field_dict('category', serializer, model=Product, foreign_key_as_list=True)
+        self.assertEqual(cached['choices'], field_dict['choices'])
+
+        Category.objects.create(name='second')
+        field_dict = utils.get_field_dict('category', serializer, model=Product, foreign_key_as_list=True)
+        self.assertIn('second', [choice['label'] for choice in field_dict['choices']])
+
+    @override_settings(DRF_AUTO_CHOICES_CACHE=True, DRF_AUTO_CHOICES_CACHE_TIMEOUT=0)
+    def test_choices_cache_timeout(self):
+        Category.objects.create(name='first')
+        serializer = Endpoint(model=Product).get_serializer()
+        utils.get_field_dict('category', serializer, model=Product, foreign_key_as_list=True)
+
+        # no signal is sent, the cached choices expire though
+        Category.objects.update(name='renamed')
+        field_dict = utils.get_field_dict('category', serializer, model=Product, foreign_key_as_list=True)
+        self.assertEqual([choice['label'] for choice in field_dict['choices']], ['renamed'])
+
     @override_settings(USE_I18N=False)
     def test_get_languages_no_i18n(self):
         languages = utils.get_languages()
@@ -19,7 +19,8 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='drf-schema-adapter',
     version='0.9.75',
-    packages=['drf_auto_endpoint', 'export_app', 'export_app.management',
+    packages=['drf_auto_endpoint', 'drf_auto_endpoint.management',
+              'drf_auto_endpoint.management.commands', 'export_app', 'export_app.management',
               'export_app.management.commands'],
     include_package_data=True,
     license='MIT License',